@@ -0,0 +1,78 @@
+from collections import deque
+
+# most actions a fighter keeps queued
+MAX_DEPTH = 32
+# game time after which a planned action is too old to act on, in ms
+MAX_PLAN_AGE = 2000
+
+
+class ActionBuffer:
+    """
+    Bounded queue of planned actions, each stamped with the tick of the game
+    state its plan was made from.
+
+    Popping is O(1), and the depth is capped: actions that don't fit are
+    dropped from the end of the incoming plan, and counted in `dropped`,
+    so the moves about to be played are kept. Actions older than `max_age`
+    are dropped instead of played, and an owner whose plans take longer
+    than that to arrive raises `max_age` to match. A newer plan replaces
+    the queued one rather than waiting behind it.
+    """
+
+    def __init__(self, clock, max_depth=MAX_DEPTH, max_age=MAX_PLAN_AGE):
+        self.clock = clock
+        self.max_depth = max_depth
+        self.max_age = max_age
+        self.actions = deque()  # (action, tick)
+        self.evicted = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.actions)
+
+    def __iter__(self):
+        return (action for action, _ in self.actions)
+
+    def extend(self, actions, tick=None):
+        if tick is None:
+            tick = self.clock.tick
+        room = self.max_depth - len(self.actions)
+        if len(actions) > room:
+            self.dropped += len(actions) - room
+            actions = actions[:room]
+        self.actions.extend((action, tick) for action in actions)
+
+    def replace(self, actions, tick=None):
+        self.actions.clear()
+        self.extend(actions, tick)
+
+    def clear(self):
+        self.actions.clear()
+
+    def evict_stale(self):
+        oldest_tick = self.clock.tick - self.clock.ticks(self.max_age)
+        while self.actions and self.actions[0][1] < oldest_tick:
+            self.actions.popleft()
+            self.evicted += 1
+
+    def pop(self):
+        """
+        Return the next action that is still fresh, or None if there is none
+        """
+        self.evict_stale()
+        if not self.actions:
+            return None
+        return self.actions.popleft()[0]
+
+    def fresh_ticks(self):
+        """
+        Return the ticks until the newest queued action goes stale, 0 if the
+        queue is empty
+        """
+        if not self.actions:
+            return 0
+        newest_tick = self.actions[-1][1]
+        return max(newest_tick + self.clock.ticks(self.max_age) - self.clock.tick, 0)
+
+    def peek(self, count):
+        return [action for action, _ in list(self.actions)[:count]]
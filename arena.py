@@ -0,0 +1,205 @@
+import argparse
+import asyncio
+import time
+
+import pygame
+
+from backends import HTTPBackend, LazyBackend, MockBackend
+from decision_cache import DecisionCache
+from engine import Match, llm_fighters
+from inference import (
+    MAX_BATCH_SIZE,
+    PRECISIONS,
+    SAMPLING_TEMPERATURE,
+    InferenceScheduler,
+    load_backend,
+)
+from llm_fighter import VALID_ACTIONS
+from metrics import metrics
+from sim_clock import FPS
+
+MODEL_NAME = "bigscience/bloom-560m"
+MATCHES = 8
+ROUNDS_PER_MATCH = 3
+
+SYSTEM_PROMPTS = [
+    "You are a very defensive player",
+    "You are a very aggressive player",
+]
+
+
+class Arena:
+    """
+    Many independent matches played in one event loop.
+
+    Every frame steps each unfinished match once, and the matches' fighters
+    share whatever model their factories were given, so one model copy
+    serves them all and their prompts batch together. `fps` paces the
+    frames against the wall clock, or leave it as None to play uncapped.
+    The optional `view` gets `on_frame(arena)` after every frame.
+    """
+
+    def __init__(self, make_fighters, count=MATCHES, fps=FPS, view=None):
+        self.matches = [Match(make_fighters(i), fps=None) for i in range(count)]
+        self.fps = fps
+        self.view = view
+        self.frame_clock = pygame.time.Clock()
+        self.running = True
+        self.finished = set()  # indexes of matches that are over
+        self.frames = 0
+
+    def stop(self):
+        self.running = False
+
+    def active(self, i):
+        return i not in self.finished
+
+    async def run(self, rounds=None):
+        """
+        Play until every match has finished `rounds` rounds, or the arena is
+        stopped. Return the score of each match.
+        """
+        while self.running and len(self.finished) < len(self.matches):
+            if self.fps is not None:
+                elapsed = self.frame_clock.tick(self.fps)
+                frame_time = 1000 / self.fps
+                if elapsed > 1.5 * frame_time:
+                    metrics.count("frames.dropped", round(elapsed / frame_time) - 1)
+            for i, match in enumerate(self.matches):
+                if i in self.finished:
+                    continue
+                await match.step()
+                if not match.running or (
+                    rounds is not None and len(match.results) >= rounds
+                ):
+                    match.cancel_requests()
+                    self.finished.add(i)
+            self.frames += 1
+            if self.view is not None:
+                self.view.on_frame(self)
+            # let finished model requests hand their moves back
+            await asyncio.sleep(0)
+        for match in self.matches:
+            match.cancel_requests()
+        return [match.score for match in self.matches]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Model Brawl League arena")
+    parser.add_argument(
+        "--matches", type=int, default=MATCHES, help="matches played at once"
+    )
+    parser.add_argument(
+        "--rounds", type=int, default=ROUNDS_PER_MATCH, help="rounds per match"
+    )
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="play without a window and without the frame cap",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--backend", choices=["transformers", "http", "mock"], default="transformers"
+    )
+    parser.add_argument("--server-url", default="http://127.0.0.1:8080")
+    parser.add_argument("--server-api", choices=["openai", "tgi"], default="openai")
+    parser.add_argument("--prefix-cache", action="store_true")
+    parser.add_argument("--precision", choices=PRECISIONS, default="fp32")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=MAX_BATCH_SIZE,
+        help="most prompts the model runs at once",
+    )
+    parser.add_argument(
+        "--decision-cache",
+        type=int,
+        metavar="SAMPLES",
+        help="answer repeated game states from a cache of this many answers each",
+    )
+    parser.add_argument("--anticipate", action="store_true")
+    parser.add_argument("--deterministic", action="store_true")
+    parser.add_argument("--show-metrics", action="store_true")
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    pygame.init()
+
+    if args.backend == "http":
+        backend = HTTPBackend(args.server_url, model=MODEL_NAME, api=args.server_api)
+    elif args.backend == "mock":
+        backend = MockBackend(VALID_ACTIONS, seed=args.seed)
+    else:
+        # a cache of several answers per state needs answers that differ
+        temperature = SAMPLING_TEMPERATURE if (args.decision_cache or 0) > 1 else 0.0
+
+        def load(timings):
+            backend = load_backend(
+                MODEL_NAME,
+                prefix_cache=args.prefix_cache,
+                timings=timings,
+                precision=args.precision,
+                threads=args.threads,
+                temperature=temperature,
+            )
+            from transformers import set_seed
+
+            set_seed(args.seed)
+            return backend
+
+        # one copy of the model for every match, loaded while the arena starts
+        backend = LazyBackend(load).start()
+        if args.headless:
+            await backend.wait()
+
+    cache = None
+    if args.decision_cache:
+        cache = DecisionCache(samples=args.decision_cache, seed=args.seed)
+    # every fighter in every match takes its turn in the same batches
+    llm = InferenceScheduler(backend, max_batch_size=args.batch_size, cache=cache)
+
+    view = None
+    sheets = (None, None)
+    if not args.headless:
+        from renderer import Spectator
+
+        view = Spectator(show_metrics=args.show_metrics)
+        sheets = (view.warrior_sheet, view.wizard_sheet)
+
+    def make_fighters(i):
+        return llm_fighters(
+            MODEL_NAME,
+            SYSTEM_PROMPTS[i % len(SYSTEM_PROMPTS)],
+            MODEL_NAME,
+            SYSTEM_PROMPTS[(i + 1) % len(SYSTEM_PROMPTS)],
+            llm,
+            *sheets,
+            adaptive_cooldown=not args.deterministic,
+            anticipate=args.anticipate,
+        )
+
+    arena = Arena(
+        make_fighters, args.matches, fps=None if args.headless else FPS, view=view
+    )
+    start = time.perf_counter()
+    scores = await arena.run(rounds=args.rounds)
+    elapsed = time.perf_counter() - start
+
+    for i, score in enumerate(scores):
+        print(f"match {i + 1}: P1 {score[0]} - P2 {score[1]}")
+    ticks = sum(match.clock.tick for match in arena.matches)
+    batch_size = llm.prompts / llm.batches if llm.batches else 0
+    print(
+        f"{ticks / elapsed:,.0f} match ticks/s, {llm.prompts / elapsed:.1f} "
+        f"decisions/s, {batch_size:.1f} prompts per batch"
+    )
+    backend.close()
+    pygame.quit()
+
+
+# This is the program entry point:
+if __name__ == "__main__":
+    asyncio.run(main())
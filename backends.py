@@ -0,0 +1,351 @@
+import asyncio
+import collections
+import http.client
+import json
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from metrics import metrics
+
+# connections an HTTPBackend keeps open to its server
+HTTP_POOL_SIZE = 4
+# seconds to wait for the server before giving up on a request
+HTTP_TIMEOUT = 60
+# moves per answer from MockBackend
+MOCK_MOVES = 6
+# prompt run once through a freshly loaded model before the fighters use it
+WARM_UP_PROMPT = "Your next moves are:"
+
+
+class Backend:
+    """
+    Interface between the fighters and a model.
+
+    `generate(prompts, max_new_tokens, prefixes)` blocks until the model has
+    answered and returns only the new text for each prompt. `prefixes` holds
+    the static start of each prompt, for backends that can cache it, and may
+    be ignored. Backends are called from worker threads, never from the
+    event loop, and can be passed to an InferenceScheduler as they are.
+
+    Backends that set `streaming` also hand back text from `stream()` as it
+    is produced. The default `stream()` yields the whole answer at once.
+    Fighters don't ask a backend for moves while its `ready` is False, and
+    `error` holds whatever stopped it from ever becoming ready.
+    """
+
+    streaming = False
+    ready = True
+    error = None
+
+    def generate(self, prompts, max_new_tokens, prefixes=None):
+        raise NotImplementedError
+
+    def __call__(self, prompts, max_new_tokens, prefixes=None):
+        return self.generate(prompts, max_new_tokens, prefixes)
+
+    async def stream(self, prompt, max_new_tokens=50, prefix=None):
+        """
+        Async generator of text chunks for one prompt
+        """
+        texts = await asyncio.to_thread(
+            self.generate, [prompt], max_new_tokens, [prefix]
+        )
+        yield texts[0]
+
+    def close(self):
+        pass
+
+
+class LazyBackend(Backend):
+    """
+    Backend that is built in a background thread, so the window and the
+    intro run while the model loads instead of freezing on startup.
+
+    `load(timings)` returns the real backend and may record how long its
+    phases took in `timings`. The backend then answers one warm-up prompt,
+    since the first generation pays for lazy initialisation, and only then
+    becomes `ready`. Calls made before that block until it is. The phases
+    go to the `model.<phase>` metrics. If loading fails, `error` holds the
+    exception and the backend never becomes ready.
+    """
+
+    def __init__(self, load, streaming=False, warm_up_prompt=WARM_UP_PROMPT):
+        self.load = load
+        self.streaming = streaming
+        self.warm_up_prompt = warm_up_prompt
+        self.backend = None
+        self.error = None
+        self.timings = {}  # startup phase -> seconds
+        self.loaded = threading.Event()
+        self.thread = None
+
+    @property
+    def ready(self):
+        return self.loaded.is_set() and self.error is None
+
+    def start(self):
+        # a daemon thread, so quitting mid-load doesn't wait for the model
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def run(self):
+        try:
+            backend = self.load(self.timings)
+            start = time.perf_counter()
+            backend.generate([self.warm_up_prompt], 1, [None])
+            self.timings["warm_up"] = time.perf_counter() - start
+            self.backend = backend
+            for phase, seconds in self.timings.items():
+                metrics.observe(f"model.{phase}", seconds * 1000)
+            metrics.write("model", ready=True, timings=self.timings)
+        except Exception as e:
+            self.error = e
+            metrics.count("model.errors")
+            metrics.write("model", ready=False, error=repr(e))
+        finally:
+            self.loaded.set()
+
+    async def wait(self):
+        """
+        Wait for the backend to finish loading, and raise if it failed
+        """
+        await asyncio.to_thread(self.loaded.wait)
+        if self.error is not None:
+            raise self.error
+
+    def get_backend(self):
+        self.loaded.wait()
+        if self.error is not None:
+            raise RuntimeError("model failed to load") from self.error
+        return self.backend
+
+    def generate(self, prompts, max_new_tokens, prefixes=None):
+        return self.get_backend().generate(prompts, max_new_tokens, prefixes)
+
+    async def stream(self, prompt, max_new_tokens=50, prefix=None):
+        await asyncio.to_thread(self.loaded.wait)
+        async for text in self.get_backend().stream(prompt, max_new_tokens, prefix):
+            yield text
+
+    def close(self):
+        if self.backend is not None:
+            self.backend.close()
+
+
+class PipelineBackend(Backend):
+    """
+    In-process Hugging Face text-generation pipeline. Prompts are run as one
+    padded batch, and the static prefixes are not used. A `temperature`
+    above 0 samples instead of decoding greedily.
+    """
+
+    def __init__(self, llm, temperature=0.0):
+        import torch
+
+        self.torch = torch
+        self.llm = llm
+        self.temperature = temperature
+        # batched causal generation pads on the left so every prompt ends at
+        # the same position
+        llm.tokenizer.padding_side = "left"
+        if llm.tokenizer.pad_token is None:
+            llm.tokenizer.pad_token = llm.tokenizer.eos_token
+
+    def generate(self, prompts, max_new_tokens, prefixes=None):
+        sampling = {}
+        if self.temperature > 0:
+            sampling = {"do_sample": True, "temperature": self.temperature}
+        # no autograd bookkeeping for a model that is only run forwards
+        with self.torch.inference_mode():
+            results = self.llm(
+                prompts,
+                max_new_tokens=max_new_tokens,
+                batch_size=len(prompts),
+                return_full_text=False,
+                **sampling,
+            )
+        return [result[0]["generated_text"] for result in results]
+
+
+class HTTPBackend(Backend):
+    """
+    Client for a model server, so one model can serve many game processes.
+
+    `api="openai"` posts each batch to an OpenAI-compatible `/v1/completions`
+    endpoint (vLLM, llama.cpp, TGI's OpenAI route) as a single request.
+    `api="tgi"` posts each prompt to a text-generation-inference style
+    `/generate` endpoint, up to `pool_size` at a time.
+
+    Connections are HTTP/1.1 keep-alive and kept in a pool between requests,
+    so a decision doesn't pay for a new TCP connection.
+    """
+
+    def __init__(
+        self,
+        url,
+        model=None,
+        api="openai",
+        pool_size=HTTP_POOL_SIZE,
+        timeout=HTTP_TIMEOUT,
+        temperature=0.0,
+    ):
+        if api not in ("openai", "tgi"):
+            raise ValueError(f"unknown server api: {api}")
+        parts = urlsplit(url)
+        self.connection_class = (
+            http.client.HTTPSConnection
+            if parts.scheme == "https"
+            else http.client.HTTPConnection
+        )
+        self.host = parts.hostname
+        self.port = parts.port
+        self.base_path = parts.path.rstrip("/")
+        self.model = model
+        self.api = api
+        self.timeout = timeout
+        self.temperature = temperature
+        self.connections = queue.LifoQueue(maxsize=pool_size)
+        self.executor = ThreadPoolExecutor(pool_size)
+        self.requests = 0
+        self.connects = 0
+
+    def get_connection(self):
+        try:
+            return self.connections.get_nowait(), True
+        except queue.Empty:
+            self.connects += 1
+            connection = self.connection_class(
+                self.host, self.port, timeout=self.timeout
+            )
+            return connection, False
+
+    def release(self, connection):
+        try:
+            self.connections.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def post(self, path, payload):
+        body = json.dumps(payload).encode()
+        headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+        while True:
+            connection, reused = self.get_connection()
+            try:
+                connection.request("POST", self.base_path + path, body, headers)
+                response = connection.getresponse()
+                data = response.read()
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                # the server may have closed an idle connection, so a pooled
+                # one gets a retry on a fresh connection
+                if reused:
+                    continue
+                raise
+            break
+
+        self.requests += 1
+        if response.will_close:
+            connection.close()
+        else:
+            self.release(connection)
+        if response.status >= 400:
+            detail = data[:200].decode(errors="replace")
+            raise RuntimeError(f"{path} returned {response.status}: {detail}")
+        return json.loads(data)
+
+    def generate(self, prompts, max_new_tokens, prefixes=None):
+        if self.api == "tgi":
+            return list(
+                self.executor.map(
+                    lambda prompt: self.generate_tgi(prompt, max_new_tokens), prompts
+                )
+            )
+
+        payload = {
+            "prompt": prompts,
+            "max_tokens": max_new_tokens,
+            "temperature": self.temperature,
+        }
+        if self.model is not None:
+            payload["model"] = self.model
+        choices = self.post("/v1/completions", payload)["choices"]
+        choices.sort(key=lambda choice: choice.get("index", 0))
+        return [choice["text"] for choice in choices]
+
+    def generate_tgi(self, prompt, max_new_tokens):
+        parameters = {"max_new_tokens": max_new_tokens}
+        if self.temperature > 0:
+            parameters.update(do_sample=True, temperature=self.temperature)
+        result = self.post("/generate", {"inputs": prompt, "parameters": parameters})
+        return result["generated_text"]
+
+    def close(self):
+        self.executor.shutdown()
+        while True:
+            try:
+                self.connections.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class MockBackend(Backend):
+    """
+    Stand-in for a model, for tests and benchmarks.
+
+    Each answer is `moves` lines drawn from `actions` with a generator seeded
+    on the seed and the prompt, so the same prompt always gets the same
+    answer whatever order prompts arrive in. A `temperature` above 0 stands
+    in for a sampling model: the generator is also seeded on how often the
+    prompt was asked before, so a repeated prompt gets a new answer.
+    `latency` seconds per call and per prompt stand in for the model's
+    cost, and `invalid_rate` is the chance of a line the move parser has to
+    reject.
+    """
+
+    def __init__(
+        self,
+        actions,
+        moves=MOCK_MOVES,
+        seed=0,
+        latency=0.0,
+        latency_per_prompt=0.0,
+        invalid_rate=0.0,
+        temperature=0.0,
+    ):
+        self.actions = list(actions)
+        self.moves = moves
+        self.seed = seed
+        self.latency = latency
+        self.latency_per_prompt = latency_per_prompt
+        self.invalid_rate = invalid_rate
+        self.temperature = temperature
+        self.asked = collections.Counter()  # prompt -> answers given
+        self.calls = 0
+        self.prompts = 0
+
+    def answer(self, prompt):
+        if self.temperature > 0:
+            rng = random.Random(f"{self.seed}:{prompt}:{self.asked[prompt]}")
+            self.asked[prompt] += 1
+        else:
+            rng = random.Random(f"{self.seed}:{prompt}")
+        lines = []
+        for _ in range(self.moves):
+            if rng.random() < self.invalid_rate:
+                lines.append("- DANCE\n")
+            else:
+                lines.append(f"- {rng.choice(self.actions)}\n")
+        return "\n" + "".join(lines)
+
+    def generate(self, prompts, max_new_tokens, prefixes=None):
+        self.calls += 1
+        self.prompts += len(prompts)
+        delay = self.latency + self.latency_per_prompt * len(prompts)
+        if delay:
+            time.sleep(delay)
+        return [self.answer(prompt) for prompt in prompts]
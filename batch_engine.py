@@ -0,0 +1,320 @@
+import numpy as np
+
+from engine import (
+    GAME_HEIGHT,
+    GAME_WIDTH,
+    INTRO_COUNT,
+    ROUND_OVER_COOLDOWN,
+    ROUND_TIME,
+    WARRIOR_ANIMATION_STEPS,
+    WIZARD_ANIMATION_STEPS,
+)
+from fighter import ANIMATION_COOLDOWN, GRAVITY, MAX_HEALTH, SPEED
+from llm_fighter import VALID_ACTIONS
+from sim_clock import FPS, SimClock
+
+# fighter physics, as in Fighter.move() and attack()
+JUMP_VELOCITY = -30
+FLOOR_MARGIN = 110
+ATTACK_DAMAGE = 10
+KNOCKBACK = 150
+ATTACK_COOLDOWN = 20
+FIGHTER_WIDTH = 80
+FIGHTER_HEIGHT = 180
+# where fighter_pair() puts the warrior and the wizard
+START_X = (200, 700)
+START_Y = 310
+
+# action codes are indexes into VALID_ACTIONS
+NOOP = -1
+MOVE_CLOSER = VALID_ACTIONS.index("MOVE_CLOSER")
+MOVE_AWAY = VALID_ACTIONS.index("MOVE_AWAY")
+HIGH_ATTACK = VALID_ACTIONS.index("HIGH_ATTACK")
+LOW_ATTACK = VALID_ACTIONS.index("LOW_ATTACK")
+JUMP = VALID_ACTIONS.index("JUMP")
+
+# animation actions, as in Fighter.update()
+IDLE, RUN, JUMPING, ATTACK_1, ATTACK_2, HIT, DEATH = range(7)
+
+
+def encode_actions(actions):
+    """
+    Return the action codes for a list of action names, with NOOP for None
+    or anything that isn't a valid action
+    """
+    return np.array(
+        [VALID_ACTIONS.index(a) if a in VALID_ACTIONS else NOOP for a in actions],
+        dtype=np.int8,
+    )
+
+
+class BatchMatch:
+    """
+    Many headless matches stepped at once, with their state in NumPy arrays.
+
+    Fighter arrays have shape (matches, 2), one column per player, and
+    match arrays have shape (matches,). `step(actions)` plays one tick of
+    every match from a (matches, 2) array of action codes. It follows
+    Match.step() and the Fighter physics exactly, including that player
+    1 moves before player 2 and sees where player 2 is. Actions are only
+    used where `can_act()` is True, which is where a fighter would have
+    taken one from its queue. Each round restarts after the usual cooldown.
+
+    MOVE_AWAY does nothing, as in Fighter.move(), which compares the
+    action against "MOVE_AWAY " with a trailing space.
+    """
+
+    def __init__(self, count, width=GAME_WIDTH, height=GAME_HEIGHT, fps=FPS):
+        self.count = count
+        self.width = width
+        self.height = height
+        self.clock = SimClock(fps)
+        self.second = self.clock.ticks(1000)
+        self.animation_cooldown = self.clock.ticks(ANIMATION_COOLDOWN)
+        self.round_over_cooldown = self.clock.ticks(ROUND_OVER_COOLDOWN)
+        # frames per animation action, per player
+        self.animation_steps = np.array(
+            [WARRIOR_ANIMATION_STEPS, WIZARD_ANIMATION_STEPS], dtype=np.int32
+        )
+
+        shape = (count, 2)
+        self.x = np.zeros(shape, dtype=np.int32)
+        self.y = np.zeros(shape, dtype=np.int32)
+        self.vel_y = np.zeros(shape, dtype=np.int32)
+        self.health = np.zeros(shape, dtype=np.int32)
+        self.attack_cooldown = np.zeros(shape, dtype=np.int32)
+        self.attack_type = np.zeros(shape, dtype=np.int8)
+        self.action = np.zeros(shape, dtype=np.int8)
+        self.frame_index = np.zeros(shape, dtype=np.int32)
+        self.shown_frame = np.zeros(shape, dtype=np.int32)
+        self.update_time = np.zeros(shape, dtype=np.int64)
+        self.flip = np.zeros(shape, dtype=bool)
+        self.running = np.zeros(shape, dtype=bool)
+        self.jump = np.zeros(shape, dtype=bool)
+        self.attacking = np.zeros(shape, dtype=bool)
+        self.hit = np.zeros(shape, dtype=bool)
+        self.alive = np.zeros(shape, dtype=bool)
+
+        self.score = np.zeros(shape, dtype=np.int32)
+        self.rounds = np.zeros(count, dtype=np.int32)
+        self.intro_count = np.zeros(count, dtype=np.int32)
+        self.timer = np.zeros(count, dtype=np.int32)
+        self.last_count_update = np.zeros(count, dtype=np.int64)
+        self.round_over = np.zeros(count, dtype=bool)
+        self.round_over_time = np.zeros(count, dtype=np.int64)
+
+        self.new_round(np.ones(count, dtype=bool))
+
+    def new_round(self, mask):
+        tick = self.clock.tick
+        self.x[mask] = START_X
+        self.y[mask] = START_Y
+        self.vel_y[mask] = 0
+        self.health[mask] = MAX_HEALTH
+        self.attack_cooldown[mask] = 0
+        self.attack_type[mask] = 0
+        self.action[mask] = IDLE
+        self.frame_index[mask] = 0
+        self.shown_frame[mask] = 0
+        self.update_time[mask] = tick
+        self.flip[mask] = (False, True)
+        self.running[mask] = False
+        self.jump[mask] = False
+        self.attacking[mask] = False
+        self.hit[mask] = False
+        self.alive[mask] = True
+
+        self.intro_count[mask] = INTRO_COUNT
+        self.timer[mask] = ROUND_TIME
+        self.last_count_update[mask] = tick
+        self.round_over[mask] = False
+
+    def can_act(self):
+        """
+        Return a (matches, 2) mask of the fighters that will use their action
+        this step
+        """
+        playing = (self.intro_count <= 0) & ~self.round_over
+        return playing[:, None] & ~self.attacking & self.alive
+
+    def step(self, actions):
+        """
+        Play one tick of every match. Return the winner of each round that
+        ended this tick: 1 or 2, 0 for a tie and -1 where no round ended.
+        """
+        tick = self.clock.tick
+        actions = np.asarray(actions)
+
+        # the intro countdown holds the fighters still, and a countdown that
+        # ends this tick only lets them act from the next one
+        playing = self.intro_count <= 0
+        can_act = self.can_act()
+        counting = ~playing & (tick - self.last_count_update >= self.second)
+        self.intro_count[counting] -= 1
+        self.last_count_update[counting] = tick
+
+        for player in (0, 1):
+            self.move(
+                player, np.where(can_act[:, player], actions[:, player], NOOP), playing
+            )
+        for player in (0, 1):
+            self.update(player)
+
+        # check for player defeat, or restart rounds that are over
+        winners = np.full(self.count, -1, dtype=np.int8)
+        restart = self.round_over & (
+            tick - self.round_over_time > self.round_over_cooldown
+        )
+        open_rounds = ~self.round_over
+        alive_1 = self.alive[:, 0]
+        alive_2 = self.alive[:, 1]
+        health_1 = self.health[:, 0]
+        health_2 = self.health[:, 1]
+        timed_out = open_rounds & alive_1 & alive_2 & (self.timer == 0)
+        winners[timed_out] = 0
+        winners[timed_out & (health_1 > health_2)] = 1
+        winners[timed_out & (health_2 > health_1)] = 2
+        winners[open_rounds & alive_1 & ~alive_2] = 1
+        winners[open_rounds & ~alive_1] = 2
+        ended = winners >= 0
+        self.score[winners == 1, 0] += 1
+        self.score[winners == 2, 1] += 1
+        self.rounds[ended] += 1
+        self.round_over[ended] = True
+        self.round_over_time[ended] = tick
+        if restart.any():
+            self.new_round(restart)
+
+        # count down timer for every 1 second of game time
+        counting = tick - self.last_count_update >= self.second
+        self.timer[counting] -= 1
+        self.last_count_update[counting] = tick
+
+        self.clock.advance()
+        return winners
+
+    def move(self, player, actions, playing):
+        target = 1 - player
+        x = self.x[:, player]
+        y = self.y[:, player]
+        vel_y = self.vel_y[:, player]
+        target_x = self.x[:, target]
+
+        self.running[playing, player] = False
+        self.attack_type[playing, player] = 0
+
+        # movement
+        closer = actions == MOVE_CLOSER
+        dx = np.where(closer, np.where(target_x > x, SPEED, -SPEED), 0)
+        self.running[closer, player] = True
+        # jump
+        jumping = (actions == JUMP) & ~self.jump[:, player]
+        vel_y[jumping] = JUMP_VELOCITY
+        self.jump[jumping, player] = True
+        # attack
+        high = actions == HIGH_ATTACK
+        low = actions == LOW_ATTACK
+        self.attack(player, high | low)
+        self.attack_type[high, player] = 1
+        self.attack_type[low, player] = 2
+
+        # apply gravity
+        vel_y[playing] += GRAVITY
+        dy = vel_y.copy()
+
+        # ensure player stays on screen
+        dx = np.where(x + dx < 0, -x, dx)
+        dx = np.where(
+            x + FIGHTER_WIDTH + dx > self.width, self.width - x - FIGHTER_WIDTH, dx
+        )
+        floor = self.height - FLOOR_MARGIN
+        landed = playing & (y + FIGHTER_HEIGHT + dy > floor)
+        vel_y[landed] = 0
+        self.jump[landed, player] = False
+        dy = np.where(landed, floor - y - FIGHTER_HEIGHT, dy)
+
+        # ensure players face each other
+        centre = FIGHTER_WIDTH // 2
+        self.flip[playing, player] = ~(target_x + centre > x + centre)[playing]
+
+        # apply attack cooldown
+        cooling = playing & (self.attack_cooldown[:, player] > 0)
+        self.attack_cooldown[cooling, player] -= 1
+
+        # update player position
+        x[playing] += dx[playing]
+        y[playing] += dy[playing]
+
+    def attack(self, player, mask):
+        target = 1 - player
+        attacks = mask & (self.attack_cooldown[:, player] == 0)
+        self.attacking[attacks, player] = True
+
+        # the attack box is twice the fighter's width, on the side it faces
+        flip = self.flip[:, player]
+        box_x = self.x[:, player] + FIGHTER_WIDTH // 2 - 2 * FIGHTER_WIDTH * flip
+        box_y = self.y[:, player]
+        target_x = self.x[:, target]
+        target_y = self.y[:, target]
+        hits = (
+            attacks
+            & (box_x < target_x + FIGHTER_WIDTH)
+            & (target_x < box_x + 2 * FIGHTER_WIDTH)
+            & (box_y < target_y + FIGHTER_HEIGHT)
+            & (target_y < box_y + FIGHTER_HEIGHT)
+        )
+        self.health[hits, target] -= ATTACK_DAMAGE
+        self.hit[hits, target] = True
+        self.x[hits, target] += np.where(flip[hits], -KNOCKBACK, KNOCKBACK)
+
+    def update(self, player):
+        tick = self.clock.tick
+        health = self.health[:, player]
+        action = self.action[:, player]
+        frame_index = self.frame_index[:, player]
+        update_time = self.update_time[:, player]
+        attack_type = self.attack_type[:, player]
+
+        # check what action the player is performing, -1 to keep the current one
+        dead = health <= 0
+        health[dead] = 0
+        self.alive[dead, player] = False
+        attacking = np.select(
+            [attack_type == 1, attack_type == 2], [ATTACK_1, ATTACK_2], -1
+        )
+        new_action = np.select(
+            [
+                dead,
+                self.hit[:, player],
+                self.attacking[:, player],
+                self.jump[:, player],
+                self.running[:, player],
+            ],
+            [DEATH, HIT, attacking, JUMPING, RUN],
+            IDLE,
+        )
+        changed = (new_action >= 0) & (new_action != action)
+        action[changed] = new_action[changed]
+        frame_index[changed] = 0
+        update_time[changed] = tick
+
+        self.shown_frame[:, player] = frame_index
+        # check if enough time has passed since the last update
+        advance = tick - update_time > self.animation_cooldown
+        frame_index[advance] += 1
+        update_time[advance] = tick
+
+        # check if the animation has finished
+        steps = self.animation_steps[player][action]
+        finished = frame_index >= steps
+        alive = self.alive[:, player]
+        frame_index[finished & ~alive] = steps[finished & ~alive] - 1
+        restart = finished & alive
+        frame_index[restart] = 0
+        # an attack ends with its animation, and taking a hit stops an attack
+        recovered = restart & (
+            (action == ATTACK_1) | (action == ATTACK_2) | (action == HIT)
+        )
+        self.attacking[recovered, player] = False
+        self.attack_cooldown[recovered, player] = ATTACK_COOLDOWN
+        self.hit[restart & (action == HIT), player] = False
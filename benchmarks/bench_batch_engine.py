@@ -0,0 +1,72 @@
+"""
+Match ticks per second of the scalar Match against BatchMatch.
+
+Fighters play random actions and never call a model, so only the physics,
+combat and round logic are timed. Run from the repository root:
+    python benchmarks/bench_batch_engine.py --ticks 1000 --counts 1 64 4096
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from batch_engine import NOOP, BatchMatch
+from controllers import ScriptedController
+from engine import Match, fighter_pair
+from llm_fighter import VALID_ACTIONS
+
+
+def random_actions(seed, count=10000):
+    rng = random.Random(seed)
+    return [rng.choice(VALID_ACTIONS) for _ in range(count)]
+
+
+async def run_scalar(ticks):
+    match = Match(
+        fighter_pair(
+            lambda clock: ScriptedController(random_actions(1)),
+            lambda clock: ScriptedController(random_actions(2)),
+        ),
+        fps=None,
+    )
+    start = time.perf_counter()
+    for _ in range(ticks):
+        await match.step()
+    return ticks / (time.perf_counter() - start)
+
+
+def run_batch(count, ticks):
+    rng = np.random.default_rng(0)
+    actions = rng.integers(NOOP, len(VALID_ACTIONS), size=(ticks, count, 2))
+    batch = BatchMatch(count)
+    start = time.perf_counter()
+    for tick in range(ticks):
+        batch.step(actions[tick])
+    return count * ticks / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ticks", type=int, default=1000)
+    parser.add_argument("--counts", type=int, nargs="+", default=[1, 64, 4096])
+    args = parser.parse_args()
+
+    scalar = asyncio.run(run_scalar(args.ticks))
+    print(f"{'scalar':<14} {scalar:12,.0f} match ticks/s")
+    for count in args.counts:
+        batch = run_batch(count, args.ticks)
+        print(
+            f"{'batch x' + str(count):<14} {batch:12,.0f} match ticks/s "
+            f"({batch / scalar:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
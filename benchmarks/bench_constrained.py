@@ -0,0 +1,108 @@
+"""
+Valid moves per second of free-text generation against constrained decoding.
+
+Both paths get the same decision prompts from a pair of headless fighters.
+Run from the repository root (downloads the model on first use):
+    python benchmarks/bench_constrained.py --decisions 20
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import llm_fighters
+from inference import ConstrainedGenerator, PrefixCachedGenerator
+from llm_fighter import VALID_ACTIONS, MoveParser
+from sim_clock import SimClock
+
+
+def decision_prompts(count):
+    fighter_1, fighter_2 = llm_fighters(
+        "p1",
+        "You are a very defensive player",
+        "p2",
+        "You are a very aggressive player",
+        None,
+    )(SimClock())
+    prompts = []
+    prefixes = []
+    for i in range(count):
+        # vary the game state a little between decisions
+        fighter, target = (
+            (fighter_1, fighter_2) if i % 2 == 0 else (fighter_2, fighter_1)
+        )
+        fighter.health = 100 - 10 * (i % 5)
+        fighter.rect.x = 200 + 60 * (i % 10)
+        # as built by LLMController.get_llm_actions
+        controller = fighter.controller
+        prompts.append(
+            f"{controller.get_game_state_prompt(target)}\nYour next moves are:"
+        )
+        prefixes.append(controller.static_prompt)
+    return prompts, prefixes
+
+
+def run(name, generate, prompts, prefixes, max_new_tokens):
+    # warm up the prefix cache so both paths are timed on the dynamic part
+    generate(prompts[:2], max_new_tokens, prefixes[:2])
+    valid = 0
+    invalid = 0
+    start = time.perf_counter()
+    for prompt, prefix in zip(prompts, prefixes):
+        parser = MoveParser()
+        parser.feed(generate([prompt], max_new_tokens, [prefix])[0])
+        parser.close()
+        valid += parser.parsed
+        invalid += len(parser.invalid_moves)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:<12} {len(prompts) / elapsed:8.2f} decisions/s "
+        f"{valid / elapsed:8.2f} valid moves/s  "
+        f"({valid} valid, {invalid} invalid, {elapsed:.1f} s)"
+    )
+    return valid / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="bigscience/bloom-560m")
+    parser.add_argument("--decisions", type=int, default=20)
+    parser.add_argument("--max-new-tokens", type=int, default=50)
+    args = parser.parse_args()
+
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    model = AutoModelForCausalLM.from_pretrained(args.model)
+    prompts, prefixes = decision_prompts(args.decisions)
+
+    free_text = run(
+        "free text",
+        PrefixCachedGenerator(model, tokenizer),
+        prompts,
+        prefixes,
+        args.max_new_tokens,
+    )
+    constrained_generator = ConstrainedGenerator(model, tokenizer, VALID_ACTIONS)
+    constrained = run(
+        "constrained",
+        constrained_generator,
+        prompts,
+        prefixes,
+        args.max_new_tokens,
+    )
+    passes = constrained_generator.forward_passes / max(
+        constrained_generator.moves_generated, 1
+    )
+    print(f"constrained decoding: {passes:.2f} forward passes per move")
+    if free_text > 0:
+        print(f"gain: {constrained / free_text:.1f}x valid moves/s")
+    else:
+        print("gain: free text produced no valid moves")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Microbenchmark for drawing the fighters: flipping the frame on every draw
+against blitting the pre-flipped frame.
+
+Run from the repository root:
+    python benchmarks/bench_draw.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+from engine import llm_fighters
+from sim_clock import SimClock
+
+FRAMES = 2000
+
+
+def draw_with_flip(fighter, surface):
+    # the old draw(): a new flipped surface on every frame
+    img = pygame.transform.flip(fighter.image, fighter.flip, False)
+    surface.blit(
+        img,
+        (
+            fighter.rect.x - (fighter.offset[0] * fighter.image_scale),
+            fighter.rect.y - (fighter.offset[1] * fighter.image_scale),
+        ),
+    )
+
+
+def time_draw(draw, fighters, surface, frames=FRAMES):
+    start = time.perf_counter()
+    for i in range(frames):
+        for fighter in fighters:
+            # cycle through every frame of the idle animation
+            fighter.frame_index = i % len(fighter.animation_list[0])
+            fighter.image = fighter.animation_list[0][fighter.frame_index]
+            fighter.flipped_image = fighter.flipped_list[0][fighter.frame_index]
+            draw(fighter, surface)
+    return (time.perf_counter() - start) / frames * 1000
+
+
+def main():
+    pygame.init()
+    from renderer import Renderer
+
+    renderer = Renderer()
+    make_fighters = llm_fighters(
+        "warrior",
+        "",
+        "wizard",
+        "",
+        None,
+        renderer.warrior_sheet,
+        renderer.wizard_sheet,
+    )
+    fighters = make_fighters(SimClock())
+    surface = renderer.game_surface
+
+    for flip in (False, True):
+        for fighter in fighters:
+            fighter.flip = flip
+        before = time_draw(draw_with_flip, fighters, surface)
+        after = time_draw(lambda fighter, s: fighter.draw(s), fighters, surface)
+        print(
+            f"flip={flip}: transform.flip {before:.3f} ms/frame, "
+            f"pre-flipped {after:.3f} ms/frame ({before / after:.1f}x)"
+        )
+
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Decision speed, latency, memory and move validity of each CPU precision.
+
+Each mode loads the model in a fresh process, so its memory footprint and
+thread settings don't leak into the next one. Run from the repository root
+(downloads the model on first use):
+    python benchmarks/bench_precision.py --decisions 20 --threads 4
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_constrained import decision_prompts
+from inference import PRECISIONS, load_backend
+from llm_fighter import MoveParser
+from metrics import percentile
+
+
+def rss_mb():
+    # resident memory right now; peak resident memory where /proc is missing
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_mode(options):
+    from transformers import AutoTokenizer, set_seed
+
+    set_seed(0)
+    before = rss_mb()
+    start = time.perf_counter()
+    backend = load_backend(
+        options["model"],
+        prefix_cache=options["prefix_cache"],
+        precision=options["precision"],
+        threads=options["threads"],
+    )
+    load_time = time.perf_counter() - start
+    memory = rss_mb() - before
+    tokenizer = AutoTokenizer.from_pretrained(options["model"])
+
+    prompts, prefixes = decision_prompts(options["decisions"])
+    max_new_tokens = options["max_new_tokens"]
+    # the first generation pays for lazy initialisation
+    backend.generate(prompts[:1], max_new_tokens, prefixes[:1])
+
+    latencies = []
+    tokens = 0
+    valid = 0
+    invalid = 0
+    for prompt, prefix in zip(prompts, prefixes):
+        start = time.perf_counter()
+        text = backend.generate([prompt], max_new_tokens, [prefix])[0]
+        latencies.append(time.perf_counter() - start)
+        tokens += len(tokenizer(text, add_special_tokens=False).input_ids)
+        parser = MoveParser()
+        parser.feed(text)
+        parser.close()
+        valid += parser.parsed
+        invalid += len(parser.invalid_moves)
+
+    latencies.sort()
+    return {
+        "precision": options["precision"],
+        "load_s": load_time,
+        "memory_mb": memory,
+        "tokens_per_s": tokens / sum(latencies),
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "valid_per_decision": valid / len(prompts),
+        "valid_rate": valid / (valid + invalid) if valid + invalid else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="bigscience/bloom-560m")
+    parser.add_argument("--decisions", type=int, default=20)
+    parser.add_argument("--max-new-tokens", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument(
+        "--precisions", nargs="+", choices=PRECISIONS, default=list(PRECISIONS)
+    )
+    parser.add_argument(
+        "--prefix-cache",
+        action="store_true",
+        help="time the prefix-cached generator instead of the pipeline",
+    )
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    print(
+        f"{'precision':<10} {'load s':>7} {'memory MB':>10} {'tokens/s':>9} "
+        f"{'p50 ms':>8} {'p99 ms':>8} {'valid/dec':>9} {'valid %':>8}"
+    )
+    for precision in args.precisions:
+        options = {
+            "model": args.model,
+            "precision": precision,
+            "threads": args.threads,
+            "prefix_cache": args.prefix_cache,
+            "decisions": args.decisions,
+            "max_new_tokens": args.max_new_tokens,
+        }
+        with context.Pool(1) as pool:
+            row = pool.apply(run_mode, (options,))
+        print(
+            f"{row['precision']:<10} {row['load_s']:>7.1f} {row['memory_mb']:>10.0f} "
+            f"{row['tokens_per_s']:>9.1f} {row['p50_ms']:>8.0f} {row['p99_ms']:>8.0f} "
+            f"{row['valid_per_decision']:>9.2f} {100 * row['valid_rate']:>7.1f}%"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""
+Benchmark suite for the game loop, rendering, sprite loading and model
+decisions, with results saved as JSON to compare between commits.
+
+Suites:
+    physics  headless match ticks/s of Match, and of BatchMatch
+    render   frame time of a match drawn with the real assets, on a dummy
+             SDL video driver
+    sprites  time to load and scale the warrior and wizard sprite sheets
+    mock     decision latency and throughput against MockBackend
+    model    the same against a real model (downloads it on first use)
+
+Every suite runs `--repeat` times with fixed seeds and reports the median.
+Run from the repository root:
+    python benchmarks/run.py --output before.json
+    python benchmarks/run.py --output after.json --compare before.json
+    python benchmarks/run.py --suites model --model bigscience/bloom-560m
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pygame
+
+from backends import MockBackend
+from batch_engine import NOOP, BatchMatch
+from controllers import ScriptedController
+from engine import Match, fighter_pair, llm_fighters
+from inference import InferenceScheduler, load_backend
+from llm_fighter import VALID_ACTIONS
+from metrics import percentile
+from sprites import clear_animation_cache, load_animations
+
+SUITES = ["physics", "render", "sprites", "mock", "model"]
+DEFAULT_SUITES = ["physics", "render", "sprites", "mock"]
+MODEL_NAME = "bigscience/bloom-560m"
+# a change this much worse than the baseline is reported as a regression
+THRESHOLD = 0.1
+
+
+def random_controllers(seed, count=10000):
+    rng = random.Random(seed)
+    actions = [rng.choice(VALID_ACTIONS) for _ in range(count)]
+    return lambda clock: ScriptedController(actions)
+
+
+def scripted_match(observers=None, warrior_sheet=None, wizard_sheet=None):
+    make_fighters = fighter_pair(
+        random_controllers(1), random_controllers(2), warrior_sheet, wizard_sheet
+    )
+    return Match(make_fighters, fps=None, observers=observers)
+
+
+async def bench_physics(args):
+    match = scripted_match()
+    start = time.perf_counter()
+    for _ in range(args.ticks):
+        await match.step()
+    scalar = args.ticks / (time.perf_counter() - start)
+
+    rng = np.random.default_rng(0)
+    count = args.batch_size
+    actions = rng.integers(NOOP, len(VALID_ACTIONS), size=(args.ticks, count, 2))
+    batch = BatchMatch(count)
+    start = time.perf_counter()
+    for tick in range(args.ticks):
+        batch.step(actions[tick])
+    batched = count * args.ticks / (time.perf_counter() - start)
+    return {
+        "physics.match_ticks_per_s": scalar,
+        "physics.batch_match_ticks_per_s": batched,
+    }
+
+
+async def bench_render(args):
+    from renderer import Renderer
+
+    renderer = Renderer()
+    match = scripted_match([renderer], renderer.warrior_sheet, renderer.wizard_sheet)
+    # the first frames pay for text rendering and sprite scaling
+    for _ in range(60):
+        await match.step()
+    frames = []
+    for _ in range(args.frames):
+        start = time.perf_counter()
+        await match.step()
+        frames.append((time.perf_counter() - start) * 1000)
+    frames.sort()
+    return {
+        "render.frame_p50_ms": percentile(frames, 0.5),
+        "render.frame_p99_ms": percentile(frames, 0.99),
+        "render.frames_per_s": len(frames) / (sum(frames) / 1000),
+    }
+
+
+async def bench_sprites(args):
+    from engine import (
+        WARRIOR_ANIMATION_STEPS,
+        WARRIOR_DATA,
+        WIZARD_ANIMATION_STEPS,
+        WIZARD_DATA,
+    )
+    from renderer import SCREEN_HEIGHT, SCREEN_WIDTH
+
+    pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    sheets = [
+        (
+            "assets/images/warrior/Sprites/warrior.png",
+            WARRIOR_DATA,
+            WARRIOR_ANIMATION_STEPS,
+        ),
+        (
+            "assets/images/wizard/Sprites/wizard.png",
+            WIZARD_DATA,
+            WIZARD_ANIMATION_STEPS,
+        ),
+    ]
+
+    start = time.perf_counter()
+    loaded = []
+    for path, data, steps in sheets:
+        loaded.append((pygame.image.load(path).convert_alpha(), data, steps))
+    image_load = time.perf_counter() - start
+
+    # the fastest of a few cold loads, as one load is too short to time alone
+    cold = []
+    for _ in range(5):
+        clear_animation_cache()
+        start = time.perf_counter()
+        for sheet, (size, scale, _), steps in loaded:
+            load_animations(sheet, size, scale, steps)
+        cold.append(time.perf_counter() - start)
+    cold = min(cold)
+
+    # every later fighter and round gets the cached frames
+    start = time.perf_counter()
+    for sheet, (size, scale, _), steps in loaded:
+        load_animations(sheet, size, scale, steps)
+    cached = time.perf_counter() - start
+    return {
+        "sprites.image_load_ms": image_load * 1000,
+        "sprites.animations_ms": cold * 1000,
+        "sprites.cached_animations_ms": cached * 1000,
+    }
+
+
+async def bench_decisions(backend, args, prefix):
+    """
+    Time `args.decisions` model decisions made `args.concurrency` at a time
+    by the fighters of headless matches, through the batching scheduler
+    """
+    llm = InferenceScheduler(backend)
+    matches = [
+        Match(llm_fighters(f"p{i}", "", f"q{i}", "", llm), fps=None)
+        for i in range((args.concurrency + 1) // 2)
+    ]
+    pairs = []
+    for match in matches:
+        pairs.append((match.fighter_1.controller, match.fighter_2))
+        pairs.append((match.fighter_2.controller, match.fighter_1))
+    pairs = pairs[: args.concurrency]
+
+    async def decide(controller, target):
+        start = time.perf_counter()
+        await controller.get_llm_actions(controller.get_game_state_prompt(target))
+        return (time.perf_counter() - start) * 1000
+
+    # the first batch pays for lazy initialisation
+    await asyncio.gather(*(decide(c, t) for c, t in pairs))
+    latencies = []
+    start = time.perf_counter()
+    while len(latencies) < args.decisions:
+        latencies.extend(await asyncio.gather(*(decide(c, t) for c, t in pairs)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        f"{prefix}.decision_p50_ms": percentile(latencies, 0.5),
+        f"{prefix}.decision_p99_ms": percentile(latencies, 0.99),
+        f"{prefix}.decisions_per_s": len(latencies) / elapsed,
+    }
+
+
+async def bench_mock(args):
+    backend = MockBackend(VALID_ACTIONS, seed=0)
+    return await bench_decisions(backend, args, "mock")
+
+
+async def bench_model(args):
+    from transformers import set_seed
+
+    set_seed(0)
+    backend = load_backend(args.model, prefix_cache=args.prefix_cache)
+    try:
+        return await bench_decisions(backend, args, "model")
+    finally:
+        backend.close()
+
+
+BENCHMARKS = {
+    "physics": bench_physics,
+    "render": bench_render,
+    "sprites": bench_sprites,
+    "mock": bench_mock,
+    "model": bench_model,
+}
+
+
+def run_suites(args):
+    results = {}
+    for suite in args.suites:
+        # the model is loaded once, and loading it is not what is measured
+        repeat = 1 if suite == "model" else args.repeat
+        runs = [asyncio.run(BENCHMARKS[suite](args)) for _ in range(repeat)]
+        for name in runs[0]:
+            results[name] = statistics.median(run[name] for run in runs)
+            print(f"{name:<36} {results[name]:>14,.3f}")
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def higher_is_better(name):
+    return name.endswith("_per_s")
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """
+    Print each result against the baseline and return the names of those
+    more than `threshold` worse
+    """
+    regressions = []
+    print(f"{'benchmark':<36} {'baseline':>14} {'now':>14} {'change':>8}")
+    for name, value in results.items():
+        if name not in baseline or not baseline[name]:
+            continue
+        before = baseline[name]
+        change = (value - before) / before
+        worse = -change if higher_is_better(name) else change
+        flag = ""
+        if worse > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<36} {before:>14,.3f} {value:>14,.3f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--suites", nargs="+", choices=SUITES, default=DEFAULT_SUITES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--ticks", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--decisions", type=int, default=200)
+    parser.add_argument(
+        "--concurrency", type=int, default=2, help="decisions in flight at once"
+    )
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--prefix-cache", action="store_true")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", metavar="PATH", help="baseline results file")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=THRESHOLD,
+        help="fraction worse than the baseline that counts as a regression",
+    )
+    args = parser.parse_args()
+
+    pygame.init()
+    results = run_suites(args)
+    pygame.quit()
+
+    report = {"environment": environment(), "settings": vars(args), "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        print()
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import itertools
+
+import pygame
+
+from action_buffer import ActionBuffer
+
+# keys for each player, in the order the fighter applies them
+PLAYER_1_KEYS = (
+    ("MOVE_LEFT", pygame.K_a),
+    ("MOVE_RIGHT", pygame.K_d),
+    ("JUMP", pygame.K_w),
+    ("HIGH_ATTACK", pygame.K_r),
+    ("LOW_ATTACK", pygame.K_t),
+)
+PLAYER_2_KEYS = (
+    ("MOVE_LEFT", pygame.K_LEFT),
+    ("MOVE_RIGHT", pygame.K_RIGHT),
+    ("JUMP", pygame.K_UP),
+    ("HIGH_ATTACK", pygame.K_KP1),
+    ("LOW_ATTACK", pygame.K_KP2),
+)
+
+
+class Controller:
+    """
+    Where a fighter's inputs come from.
+
+    The fighter calls `poll(target, round_over)` at the start of every move,
+    and `next_actions(target)` only when it is free to act. The fighter
+    plays every action name in the returned tuple, so a keyboard can move,
+    jump and attack at once. Controllers that plan ahead show their next
+    moves through `peek()`, and report the plans they receive through
+    `on_plan(fighter, request_tick, moves)` when the match sets it. Model
+    controllers also report every answer, with the prompt it was for and
+    the moves it listed, through `on_response(fighter, request_tick,
+    prompt, text, moves)`.
+    """
+
+    name = "player"
+    ready = True
+    error = None  # why the controller will never be ready
+
+    def __init__(self):
+        self.fighter = None
+        self.on_plan = None
+        self.on_response = None
+
+    def attach(self, fighter):
+        self.fighter = fighter
+
+    async def poll(self, target, round_over):
+        pass
+
+    def next_actions(self, target):
+        return ()
+
+    def peek(self, count):
+        return []
+
+    def cancel(self):
+        pass
+
+
+class KeyboardController(Controller):
+    """
+    Human player on the keyboard: WASD with R and T to attack for player 1,
+    the arrow keys with keypad 1 and 2 for player 2
+    """
+
+    name = "human"
+
+    def __init__(self, keys=None):
+        super().__init__()
+        self.keys = keys
+
+    def attach(self, fighter):
+        super().attach(fighter)
+        if self.keys is None:
+            self.keys = PLAYER_1_KEYS if fighter.player == 1 else PLAYER_2_KEYS
+
+    def next_actions(self, target):
+        pressed = pygame.key.get_pressed()
+        return tuple(action for action, key in self.keys if pressed[key])
+
+
+class ScriptedController(Controller):
+    """
+    Plays a fixed list of actions, one each time the fighter is free to act,
+    and loops over it unless `loop` is False. None stands for no action.
+    """
+
+    name = "scripted"
+
+    def __init__(self, actions, loop=True):
+        super().__init__()
+        self.actions = list(actions)
+        self.moves = itertools.cycle(self.actions) if loop else iter(self.actions)
+
+    def next_actions(self, target):
+        action = next(self.moves, None)
+        return () if action is None else (action,)
+
+
+class ReplayController(Controller):
+    """
+    Plays a fighter from the plans recorded for it, with no model.
+
+    Each plan reaches the fighter's queue on the tick it did when it was
+    recorded. A plan with the same request tick as the one before is a
+    later part of a streamed plan and is added to the queue, and any other
+    plan replaces it, as LLMController does. Since the physics are
+    deterministic, the match plays out the same as the recorded one.
+    """
+
+    def __init__(self, plans, name="replay"):
+        super().__init__()
+        self.name = name
+        self.plans = plans  # (tick, moves, request tick) in arrival order
+        self.next_plan = 0
+        self.request_tick = None
+        self.action_queue = None
+
+    def attach(self, fighter):
+        super().attach(fighter)
+        self.action_queue = ActionBuffer(fighter.clock)
+        # plans for rounds before this fighter's are skipped
+        tick = fighter.clock.tick
+        while self.next_plan < len(self.plans) and self.plans[self.next_plan][0] < tick:
+            self.next_plan += 1
+
+    async def poll(self, target, round_over):
+        tick = self.fighter.clock.tick
+        while (
+            self.next_plan < len(self.plans) and self.plans[self.next_plan][0] <= tick
+        ):
+            _, moves, request_tick = self.plans[self.next_plan]
+            self.next_plan += 1
+            if request_tick == self.request_tick:
+                self.action_queue.extend(moves, request_tick)
+            else:
+                self.action_queue.replace(moves, request_tick)
+            self.request_tick = request_tick
+        if round_over:
+            self.action_queue.clear()
+
+    def next_actions(self, target):
+        action = self.action_queue.pop()
+        return () if action is None else (action,)
+
+    def peek(self, count):
+        return self.action_queue.peek(count)
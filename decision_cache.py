@@ -0,0 +1,94 @@
+import random
+import time
+from collections import OrderedDict
+
+MAX_DECISIONS = 1024
+
+
+class DecisionCache:
+    """
+    Memo of model answers in front of the model call.
+
+    `context_prompt()` only describes a coarse game state, so the same prompt
+    comes up again and again. Answers are keyed on the full prompt by
+    default, or on whatever `key(prompt)` returns, and evicted least recently
+    used first or once they are `ttl` seconds old.
+
+    With `samples` above 1 a key keeps missing until that many answers are
+    stored, and hits then pick one of them at random, so cached play still
+    varies when the model samples. An answer that repeats one already
+    stored ends the collecting early, as a model that decodes greedily
+    would only give the same answer again.
+    """
+
+    def __init__(
+        self, max_size=MAX_DECISIONS, ttl=None, samples=1, seed=None, key=None
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.samples = samples
+        self.rng = random.Random(seed)
+        self.key = key or (lambda prompt: prompt)
+        self.entries = OrderedDict()  # key -> [time stored, [answers], full]
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.expired = 0
+
+    def lookup(self, prompt):
+        """
+        Return a cached answer for the prompt, or None on a miss
+        """
+        key = self.key(prompt)
+        entry = self.entries.get(key)
+        if (
+            entry is not None
+            and self.ttl is not None
+            and time.monotonic() - entry[0] > self.ttl
+        ):
+            del self.entries[key]
+            self.expired += 1
+            entry = None
+
+        if entry is None or not entry[2]:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return self.rng.choice(entry[1])
+
+    def store(self, prompt, answer):
+        key = self.key(prompt)
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = [time.monotonic(), [], False]
+            self.entries[key] = entry
+        if not entry[2]:
+            if answer in entry[1]:
+                entry[2] = True
+            else:
+                entry[1].append(answer)
+                entry[2] = len(entry[1]) >= self.samples
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evicted += 1
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate(),
+            "size": len(self.entries),
+            "evicted": self.evicted,
+            "expired": self.expired,
+        }
+
+    def clear(self):
+        self.entries.clear()
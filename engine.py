@@ -0,0 +1,263 @@
+import asyncio
+import time
+
+import pygame
+
+from fighter import Fighter
+from llm_fighter import LLMController
+from metrics import metrics
+from sim_clock import FPS, SimClock
+
+# game area
+GAME_WIDTH = 1000
+GAME_HEIGHT = 600
+
+# round settings
+ROUND_TIME = 99
+INTRO_COUNT = 3
+ROUND_OVER_COOLDOWN = 2000
+
+# define fighter variables
+WARRIOR_SIZE = 162
+WARRIOR_SCALE = 4
+WARRIOR_OFFSET = [72, 56]
+WARRIOR_DATA = [WARRIOR_SIZE, WARRIOR_SCALE, WARRIOR_OFFSET]
+WIZARD_SIZE = 250
+WIZARD_SCALE = 3
+WIZARD_OFFSET = [112, 107]
+WIZARD_DATA = [WIZARD_SIZE, WIZARD_SCALE, WIZARD_OFFSET]
+
+# define number of steps in each animation
+WARRIOR_ANIMATION_STEPS = [10, 8, 1, 7, 7, 3, 7]
+WIZARD_ANIMATION_STEPS = [8, 8, 1, 8, 8, 3, 7]
+
+
+def fighter_pair(
+    make_controller_1, make_controller_2, warrior_sheet=None, wizard_sheet=None
+):
+    """
+    Return a factory that builds the warrior and wizard for a round, each
+    played by the controller its `make_controller(clock)` returns. Leave the
+    sprite sheets as None for a headless match.
+    """
+
+    def make_fighters(clock):
+        fighter_1 = Fighter(
+            1,
+            200,
+            310,
+            False,
+            WARRIOR_DATA,
+            warrior_sheet,
+            WARRIOR_ANIMATION_STEPS,
+            clock,
+            make_controller_1(clock),
+        )
+        fighter_2 = Fighter(
+            2,
+            700,
+            310,
+            True,
+            WIZARD_DATA,
+            wizard_sheet,
+            WIZARD_ANIMATION_STEPS,
+            clock,
+            make_controller_2(clock),
+        )
+        return fighter_1, fighter_2
+
+    return make_fighters
+
+
+def llm_fighters(
+    model_1,
+    system_prompt_1,
+    model_2,
+    system_prompt_2,
+    llm,
+    warrior_sheet=None,
+    wizard_sheet=None,
+    adaptive_cooldown=True,
+    llm_2=None,
+    anticipate=False,
+):
+    """
+    Return a factory that builds the warrior and wizard LLM fighters for a round.
+    Leave the sprite sheets as None for a headless match, and turn off
+    `adaptive_cooldown` for matches that must replay exactly. Player 2 uses
+    `llm_2` when the fighters run different models, and `anticipate` asks
+    for each plan before the last one runs out.
+    """
+    if llm_2 is None:
+        llm_2 = llm
+
+    return fighter_pair(
+        lambda clock: LLMController(
+            model_1,
+            system_prompt_1,
+            llm,
+            clock,
+            adaptive_cooldown=adaptive_cooldown,
+            anticipate=anticipate,
+        ),
+        lambda clock: LLMController(
+            model_2,
+            system_prompt_2,
+            llm_2,
+            clock,
+            adaptive_cooldown=adaptive_cooldown,
+            anticipate=anticipate,
+        ),
+        warrior_sheet,
+        wizard_sheet,
+    )
+
+
+class Match:
+    """
+    Runs the physics, combat and round logic of a match without a display.
+
+    Observers (e.g. the Renderer) get `on_step(match)` after every step, and
+    `on_plan(match, fighter, request_tick, moves)` and `on_response(match,
+    fighter, request_tick, prompt, text, moves)` if they have them. Game
+    time is a fixed-timestep SimClock advanced once per step, and `fps` only
+    paces the steps against the wall clock. With `fps=None` the match is
+    uncapped and steps as fast as the CPU and model allow.
+    """
+
+    def __init__(
+        self,
+        make_fighters,
+        fps=FPS,
+        observers=None,
+        width=GAME_WIDTH,
+        height=GAME_HEIGHT,
+    ):
+        self.make_fighters = make_fighters
+        self.fps = fps
+        self.observers = list(observers or [])
+        self.width = width
+        self.height = height
+        self.clock = SimClock()
+        self.frame_clock = pygame.time.Clock()
+        self.running = True
+        self.score = [0, 0]  # player scores. [P1, P2]
+        self.results = []  # winner of each round, 0 for a tie
+        self.fighter_1 = None
+        self.fighter_2 = None
+        self.new_round()
+
+    def add_observer(self, observer):
+        self.observers.append(observer)
+
+    def stop(self):
+        self.running = False
+
+    def cancel_requests(self):
+        if self.fighter_1 is not None:
+            self.fighter_1.controller.cancel()
+            self.fighter_2.controller.cancel()
+
+    def plan_arrived(self, fighter, request_tick, moves):
+        for observer in self.observers:
+            if hasattr(observer, "on_plan"):
+                observer.on_plan(self, fighter, request_tick, moves)
+
+    def response_arrived(self, fighter, request_tick, prompt, text, moves):
+        for observer in self.observers:
+            if hasattr(observer, "on_response"):
+                observer.on_response(self, fighter, request_tick, prompt, text, moves)
+
+    def new_round(self):
+        self.cancel_requests()
+        self.fighter_1, self.fighter_2 = self.make_fighters(self.clock)
+        self.fighter_1.controller.on_plan = self.plan_arrived
+        self.fighter_2.controller.on_plan = self.plan_arrived
+        self.fighter_1.controller.on_response = self.response_arrived
+        self.fighter_2.controller.on_response = self.response_arrived
+        self.round_over = False
+        self.round_over_time = None
+        self.intro_count = INTRO_COUNT
+        self.timer = ROUND_TIME
+        self.last_count_update = self.clock.tick
+
+    def end_round(self, winner):
+        if winner:
+            self.score[winner - 1] += 1
+        self.results.append(winner)
+        self.round_over = True
+        self.round_over_time = self.clock.tick
+
+    async def step(self):
+        fighter_1 = self.fighter_1
+        fighter_2 = self.fighter_2
+        start = phase = time.perf_counter()
+
+        # update countdown
+        if self.intro_count <= 0:
+            # move fighters
+            await fighter_1.move(self.width, self.height, fighter_2, self.round_over)
+            await fighter_2.move(self.width, self.height, fighter_1, self.round_over)
+        elif (self.clock.tick - self.last_count_update) >= self.clock.ticks(1000):
+            self.intro_count -= 1
+            self.last_count_update = self.clock.tick
+        phase = metrics.since("frame.move", phase)
+
+        # update fighters
+        fighter_1.update()
+        fighter_2.update()
+        metrics.since("frame.update", phase)
+
+        # check for player defeat
+        if self.round_over == False:
+            if fighter_1.alive == False:
+                self.end_round(2)
+            elif fighter_2.alive == False:
+                self.end_round(1)
+            elif self.timer == 0:
+                if fighter_1.health > fighter_2.health:
+                    self.end_round(1)
+                elif fighter_2.health > fighter_1.health:
+                    self.end_round(2)
+                else:
+                    # no winner
+                    self.end_round(0)
+        elif self.clock.tick - self.round_over_time > self.clock.ticks(
+            ROUND_OVER_COOLDOWN
+        ):
+            self.new_round()
+
+        # count down timer for every 1 second of game time
+        if (self.clock.tick - self.last_count_update) >= self.clock.ticks(1000):
+            self.timer -= 1
+            self.last_count_update = self.clock.tick
+
+        for observer in self.observers:
+            observer.on_step(self)
+        metrics.since("frame.step", start)
+
+        # export a summary once a second of game time
+        if self.clock.tick % self.clock.ticks(1000) == 0:
+            metrics.write_summary(tick=self.clock.tick)
+
+        self.clock.advance()
+
+    async def run(self, rounds=None):
+        """
+        Step the match until it is stopped or `rounds` rounds have finished.
+        Return the score.
+        """
+        while self.running:
+            if self.fps is not None:
+                elapsed = self.frame_clock.tick(self.fps)
+                # frames that should have been shown while this one was late
+                frame_time = 1000 / self.fps
+                if elapsed > 1.5 * frame_time:
+                    metrics.count("frames.dropped", round(elapsed / frame_time) - 1)
+            await self.step()
+            if rounds is not None and len(self.results) >= rounds:
+                break
+            # let finished model requests hand their moves back
+            await asyncio.sleep(0)
+        self.cancel_requests()
+        return self.score
@@ -1,18 +1,82 @@
 import pygame
 
+from sprites import load_animations
+
+MAX_HEALTH = 100
+ANIMATION_COOLDOWN = 50
+# pixels per tick
+SPEED = 10
+GRAVITY = 2
+
 
 class Fighter:
-    def __init__(self, player, x, y, flip, data, sprite_sheet, animation_steps, sound):
+    """
+    Physics, combat and animation state of one fighter.
+
+    The inputs come from a controller (keyboard, LLM, scripted or replay),
+    so every kind of player shares this one copy of the physics. The state
+    lives in `__slots__`, which keeps instances small and attribute lookups
+    in the per-frame code fast. Leave the sprite sheet as None for a
+    headless fighter, which skips image loading.
+    """
+
+    __slots__ = (
+        "player",
+        "size",
+        "image_scale",
+        "offset",
+        "flip",
+        "clock",
+        "animation_steps",
+        "animation_list",
+        "flipped_list",
+        "action",
+        "frame_index",
+        "shown_frame",
+        "image",
+        "flipped_image",
+        "update_time",
+        "rect",
+        "vel_y",
+        "running",
+        "jump",
+        "attacking",
+        "attack_type",
+        "attack_cooldown",
+        "hit",
+        "health",
+        "alive",
+        "last_action",
+        "controller",
+    )
+
+    def __init__(
+        self, player, x, y, flip, data, sprite_sheet, animation_steps, clock, controller
+    ):
         self.player = player
         self.size = data[0]
         self.image_scale = data[1]
         self.offset = data[2]
         self.flip = flip
-        self.animation_list = self.load_images(sprite_sheet, animation_steps)
+        self.clock = clock
+        self.animation_steps = animation_steps
+        # headless fighters have no sprite sheet and skip image loading
+        if sprite_sheet is not None:
+            self.animation_list, self.flipped_list = load_animations(
+                sprite_sheet, self.size, self.image_scale, animation_steps
+            )
+        else:
+            self.animation_list = None
+            self.flipped_list = None
         self.action = 0  # 0:idle #1:run #2:jump #3:attack1 #4: attack2 #5:hit #6:death
         self.frame_index = 0
-        self.image = self.animation_list[self.action][self.frame_index]
-        self.update_time = pygame.time.get_ticks()
+        self.shown_frame = 0  # frame index of the image drawn this tick
+        self.image = None
+        self.flipped_image = None
+        if self.animation_list is not None:
+            self.image = self.animation_list[self.action][self.frame_index]
+            self.flipped_image = self.flipped_list[self.action][self.frame_index]
+        self.update_time = self.clock.tick
         self.rect = pygame.Rect((x, y, 80, 180))
         self.vel_y = 0
         self.running = False
@@ -20,86 +84,81 @@ class Fighter:
         self.attacking = False
         self.attack_type = 0
         self.attack_cooldown = 0
-        self.attack_sound = sound
         self.hit = False
-        self.health = 100
+        self.health = MAX_HEALTH
         self.alive = True
         self.last_action = None
+        self.controller = controller
+        controller.attach(self)
+
+    @property
+    def name(self):
+        return self.controller.name
+
+    @property
+    def model_ready(self):
+        return self.controller.ready
+
+    @property
+    def model_error(self):
+        return self.controller.error
+
+    def upcoming_actions(self, count):
+        return self.controller.peek(count)
 
-    def load_images(self, sprite_sheet, animation_steps):
-        # extract images from spritesheet
-        animation_list = []
-        for y, animation in enumerate(animation_steps):
-            temp_img_list = []
-            for x in range(animation):
-                temp_img = sprite_sheet.subsurface(
-                    x * self.size, y * self.size, self.size, self.size
-                )
-                temp_img_list.append(
-                    pygame.transform.scale(
-                        temp_img,
-                        (self.size * self.image_scale, self.size * self.image_scale),
-                    )
-                )
-            animation_list.append(temp_img_list)
-        return animation_list
-
-    def move(self, screen_width, screen_height, target, round_over):
-        SPEED = 10
-        GRAVITY = 2
+    async def move(self, screen_width, screen_height, target, round_over):
         dx = 0
         dy = 0
         self.running = False
         self.attack_type = 0
 
-        # get keypresses
-        key = pygame.key.get_pressed()
+        await self.controller.poll(target, round_over)
 
         # can only perform other actions if not currently attacking
         if self.attacking == False and self.alive == True and round_over == False:
-            # check player 1 controls
-            if self.player == 1:
-                # movement
-                if key[pygame.K_a]:
-                    dx = -SPEED
-                    self.running = True
-                if key[pygame.K_d]:
+
+            actions = self.controller.next_actions(target)
+
+            # movement
+            if "MOVE_CLOSER" in actions:
+
+                # if target is on the left move left
+                if target.rect.x > self.rect.x:
                     dx = SPEED
                     self.running = True
-                # jump
-                if key[pygame.K_w] and self.jump == False:
-                    self.vel_y = -30
-                    self.jump = True
-                # attack
-                if key[pygame.K_r] or key[pygame.K_t]:
-                    self.attack(target)
-                    # determine which attack type was used
-                    if key[pygame.K_r]:
-                        self.attack_type = 1
-                    if key[pygame.K_t]:
-                        self.attack_type = 2
-
-            # check player 2 controls
-            if self.player == 2:
-                # movement
-                if key[pygame.K_LEFT]:
+                else:
                     dx = -SPEED
                     self.running = True
-                if key[pygame.K_RIGHT]:
+            if "MOVE_AWAY " in actions:
+                # if target is on the left move right
+                if target.rect.x > self.rect.x:
                     dx = SPEED
                     self.running = True
-                # jump
-                if key[pygame.K_UP] and self.jump == False:
-                    self.vel_y = -30
-                    self.jump = True
-                # attack
-                if key[pygame.K_KP1] or key[pygame.K_KP2]:
-                    self.attack(target)
-                    # determine which attack type was used
-                    if key[pygame.K_KP1]:
-                        self.attack_type = 1
-                    if key[pygame.K_KP2]:
-                        self.attack_type = 2
+                else:
+                    dx = -SPEED
+                    self.running = True
+                # dx = SPEED
+                # self.running = True
+            if "MOVE_LEFT" in actions:
+                dx = -SPEED
+                self.running = True
+            if "MOVE_RIGHT" in actions:
+                dx = SPEED
+                self.running = True
+            # jump
+            if "JUMP" in actions and self.jump == False:
+                self.vel_y = -30
+                self.jump = True
+            # attack
+            high_attack = "HIGH_ATTACK" in actions
+            low_attack = "LOW_ATTACK" in actions
+            if high_attack or low_attack:
+                self.attack(target)
+                # determine which attack type was used
+                if high_attack:
+                    self.attack_type = 1
+                if low_attack:
+                    self.attack_type = 2
 
         # apply gravity
         self.vel_y += GRAVITY
@@ -150,18 +209,21 @@ class Fighter:
         else:
             self.update_action(0)  # 0:idle
 
-        animation_cooldown = 50
+        animation_cooldown = self.clock.ticks(ANIMATION_COOLDOWN)
         # update image
-        self.image = self.animation_list[self.action][self.frame_index]
+        self.shown_frame = self.frame_index
+        if self.animation_list is not None:
+            self.image = self.animation_list[self.action][self.frame_index]
+            self.flipped_image = self.flipped_list[self.action][self.frame_index]
         # check if enough time has passed since the last update
-        if pygame.time.get_ticks() - self.update_time > animation_cooldown:
+        if self.clock.tick - self.update_time > animation_cooldown:
             self.frame_index += 1
-            self.update_time = pygame.time.get_ticks()
+            self.update_time = self.clock.tick
         # check if the animation has finished
-        if self.frame_index >= len(self.animation_list[self.action]):
+        if self.frame_index >= self.animation_steps[self.action]:
             # if the player is dead then end the animation
             if self.alive == False:
-                self.frame_index = len(self.animation_list[self.action]) - 1
+                self.frame_index = self.animation_steps[self.action] - 1
             else:
                 self.frame_index = 0
                 # check if an attack was executed
@@ -179,7 +241,6 @@ class Fighter:
         if self.attack_cooldown == 0:
             # execute attack
             self.attacking = True
-            # self.attack_sound.play()
             attacking_rect = pygame.Rect(
                 self.rect.centerx - (2 * self.rect.width * self.flip),
                 self.rect.y,
@@ -189,7 +250,6 @@ class Fighter:
             if attacking_rect.colliderect(target.rect):
                 target.health -= 10
                 target.hit = True
-
                 # move target back on x axis based on oppside side they are facing
                 if self.flip == True:
                     target.rect.x -= 150
@@ -202,11 +262,12 @@ class Fighter:
             self.action = new_action
             # update the animation settings
             self.frame_index = 0
-            self.update_time = pygame.time.get_ticks()
+            self.update_time = self.clock.tick
 
     def draw(self, surface):
-        img = pygame.transform.flip(self.image, self.flip, False)
-        surface.blit(
+        # both facings are prepared when the sprites load
+        img = self.flipped_image if self.flip else self.image
+        return surface.blit(
             img,
             (
                 self.rect.x - (self.offset[0] * self.image_scale),
@@ -0,0 +1,459 @@
+import asyncio
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from backends import Backend, PipelineBackend
+from metrics import metrics
+
+# how long to wait for more prompts before running a batch, in seconds
+BATCH_WINDOW = 0.005
+MAX_BATCH_SIZE = 16
+# static prompt prefixes kept by PrefixCachedGenerator
+MAX_PREFIXES = 8
+# moves per decision for ConstrainedGenerator
+CONSTRAINED_MOVES = 6
+# weight formats for CPU inference, see configure_model
+PRECISIONS = ("fp32", "bf16", "int8")
+# temperature for backends that should sample varied answers, e.g. to fill
+# a DecisionCache with more than one answer per state
+SAMPLING_TEMPERATURE = 0.8
+
+
+def load_backend(
+    model_name,
+    prefix_cache=False,
+    streaming=False,
+    constrained_actions=None,
+    timings=None,
+    precision="fp32",
+    threads=None,
+    temperature=0.0,
+):
+    """
+    Load a Hugging Face causal language model in this process and return a
+    Backend for it. Passing `constrained_actions` restricts the output to a
+    list of those actions. `precision` and `threads` are passed on to
+    configure_model. The model decodes greedily unless `temperature` is
+    above 0, when it samples. The seconds spent importing transformers and
+    loading the model are recorded in `timings` when it is given.
+    """
+    if timings is None:
+        timings = {}
+    start = time.perf_counter()
+    from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
+
+    timings["import"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    hf_model = AutoModelForCausalLM.from_pretrained(model_name)
+    hf_model = configure_model(hf_model, precision, threads)
+    timings["load"] = time.perf_counter() - start
+    if constrained_actions is not None:
+        return ConstrainedGenerator(
+            hf_model, tokenizer, constrained_actions, temperature=temperature
+        )
+    if streaming:
+        return StreamingGenerator(hf_model, tokenizer, temperature=temperature)
+    if prefix_cache:
+        return PrefixCachedGenerator(hf_model, tokenizer, temperature=temperature)
+    text_generation = pipeline("text-generation", model=hf_model, tokenizer=tokenizer)
+    return PipelineBackend(text_generation, temperature=temperature)
+
+
+def configure_model(model, precision="fp32", threads=None):
+    """
+    Prepare a model for CPU inference and return it.
+
+    `bf16` halves the weights and is fast on CPUs with native bfloat16
+    support (AVX512-BF16 or AMX), but can be slower than fp32 elsewhere.
+    `int8` applies dynamic quantization to the linear layers, which hold
+    nearly all of the weights: they are stored as int8 and activations are
+    quantized on the fly. `threads` pins the number of torch threads.
+    """
+    import torch
+
+    if precision not in PRECISIONS:
+        raise ValueError(f"unknown precision: {precision}")
+    if threads:
+        torch.set_num_threads(threads)
+
+    model.eval()
+    if precision == "bf16":
+        model = model.to(torch.bfloat16)
+    elif precision == "int8":
+        model = torch.ao.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    return model
+
+
+class PrefixCachedGenerator(Backend):
+    """
+    Backend that keeps the model's past key values for each static prompt
+    prefix (the game description, moves and examples).
+
+    The prefix is encoded once per fighter persona, and each decision only
+    runs the model over the short dynamic suffix. Prompts are generated one
+    after another, because prompts with different cached prefixes can't
+    share a padded batch, and a lock keeps callers on different threads
+    from generating at the same time, which would have them contend for
+    the CPU and share the prefix cache unguarded. A `temperature` above 0
+    samples instead of decoding greedily.
+    """
+
+    def __init__(self, model, tokenizer, max_prefixes=MAX_PREFIXES, temperature=0.0):
+        import torch
+
+        self.torch = torch
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_prefixes = max_prefixes
+        self.temperature = temperature
+        self.lock = threading.Lock()
+        self.prefix_cache = OrderedDict()  # prefix text -> (input ids, past)
+        self.hits = 0
+        self.misses = 0
+
+    def get_prefix(self, prefix):
+        if prefix in self.prefix_cache:
+            self.hits += 1
+            self.prefix_cache.move_to_end(prefix)
+            return self.prefix_cache[prefix]
+
+        self.misses += 1
+        input_ids = self.tokenizer(prefix, return_tensors="pt").input_ids
+        with self.torch.inference_mode():
+            past = self.model(input_ids, use_cache=True).past_key_values
+        self.prefix_cache[prefix] = (input_ids, past)
+        if len(self.prefix_cache) > self.max_prefixes:
+            self.prefix_cache.popitem(last=False)
+        return input_ids, past
+
+    def prepare_inputs(self, prompt, prefix):
+        """
+        Return the input ids for a prompt, a private copy of its cached prefix
+        (None if it has none) and the number of tokens the copy covers
+        """
+        torch = self.torch
+        if prefix is not None and prompt.startswith(prefix):
+            prefix_ids, prefix_past = self.get_prefix(prefix)
+            # tokenize the suffix on its own so its ids line up with the cache
+            suffix_ids = self.tokenizer(
+                prompt[len(prefix) :], return_tensors="pt", add_special_tokens=False
+            ).input_ids
+            input_ids = torch.cat([prefix_ids, suffix_ids], dim=1)
+            # generate() extends the cache in place, so each call gets a copy
+            return input_ids, copy.deepcopy(prefix_past), prefix_ids.shape[1]
+
+        input_ids = self.tokenizer(prompt, return_tensors="pt").input_ids
+        return input_ids, None, 0
+
+    def generate_one(self, prompt, prefix, max_new_tokens, **generate_kwargs):
+        torch = self.torch
+        if self.temperature > 0:
+            generate_kwargs.update(do_sample=True, temperature=self.temperature)
+        with self.lock, torch.inference_mode():
+            input_ids, past, _ = self.prepare_inputs(prompt, prefix)
+            output = self.model.generate(
+                input_ids,
+                attention_mask=torch.ones_like(input_ids),
+                past_key_values=past,
+                max_new_tokens=max_new_tokens,
+                pad_token_id=self.tokenizer.pad_token_id,
+                **generate_kwargs,
+            )
+        return self.tokenizer.decode(
+            output[0, input_ids.shape[1] :], skip_special_tokens=True
+        )
+
+    def generate(self, prompts, max_new_tokens, prefixes=None):
+        if prefixes is None:
+            prefixes = [None] * len(prompts)
+        return [
+            self.generate_one(prompt, prefix, max_new_tokens)
+            for prompt, prefix in zip(prompts, prefixes)
+        ]
+
+
+class ConstrainedGenerator(PrefixCachedGenerator):
+    """
+    Backend that can only answer with `- <ACTION>` lines.
+
+    The tokens of every `- <ACTION>` line are kept in a trie. At each branch
+    the model's logits are compared over the allowed next tokens only, and
+    the tokens between branches are forced. A move costs one forward pass per
+    branch point, usually one or two, with no free text to throw away.
+    """
+
+    def __init__(
+        self,
+        model,
+        tokenizer,
+        actions,
+        moves=CONSTRAINED_MOVES,
+        temperature=0.0,
+        seed=0,
+        max_prefixes=MAX_PREFIXES,
+    ):
+        super().__init__(model, tokenizer, max_prefixes, temperature)
+        self.moves = moves
+        self.rng = self.torch.Generator().manual_seed(seed)
+        self.newline_ids = self.encode("\n")
+        # token trie: token id -> subtrie, with the action under None at a leaf
+        self.trie = {}
+        for action in actions:
+            node = self.trie
+            for token in self.encode(f"- {action}\n"):
+                node = node.setdefault(token, {})
+            node[None] = action
+        self.forward_passes = 0
+        self.moves_generated = 0
+
+    def encode(self, text):
+        return self.tokenizer(text, add_special_tokens=False).input_ids
+
+    def forward(self, pending, past):
+        self.forward_passes += 1
+        input_ids = self.torch.tensor([pending])
+        output = self.model(input_ids=input_ids, past_key_values=past, use_cache=True)
+        return output.logits[0, -1], output.past_key_values
+
+    def choose(self, logits, allowed):
+        scores = logits[allowed]
+        if self.temperature > 0:
+            probs = self.torch.softmax(scores / self.temperature, dim=-1)
+            index = self.torch.multinomial(probs, 1, generator=self.rng).item()
+        else:
+            index = scores.argmax().item()
+        return allowed[index]
+
+    def generate_moves(self, prompt, prefix):
+        with self.lock:
+            return self.choose_moves(prompt, prefix)
+
+    def choose_moves(self, prompt, prefix):
+        input_ids, past, cached = self.prepare_inputs(prompt, prefix)
+        # tokens not yet run through the model
+        pending = input_ids[0, cached:].tolist() + self.newline_ids
+        moves = []
+        with self.torch.inference_mode():
+            for _ in range(self.moves):
+                node = self.trie
+                while None not in node:
+                    allowed = list(node)
+                    if len(allowed) == 1:
+                        token = allowed[0]
+                    else:
+                        logits, past = self.forward(pending, past)
+                        pending = []
+                        token = self.choose(logits, allowed)
+                    pending.append(token)
+                    node = node[token]
+                moves.append(node[None])
+        self.moves_generated += len(moves)
+        return moves
+
+    def generate(self, prompts, max_new_tokens, prefixes=None):
+        if prefixes is None:
+            prefixes = [None] * len(prompts)
+        texts = []
+        for prompt, prefix in zip(prompts, prefixes):
+            moves = self.generate_moves(prompt, prefix)
+            texts.append("\n" + "".join(f"- {move}\n" for move in moves))
+        return texts
+
+
+class StreamingGenerator(PrefixCachedGenerator):
+    """
+    Generates one prompt at a time and hands the decoded text back as the
+    tokens are produced, so a fighter can act on its first moves before the
+    generation finishes. Generation stops as soon as the reader stops
+    reading, and a stream started while another is generating waits for
+    it to finish.
+    """
+
+    streaming = True
+
+    def __init__(self, model, tokenizer, max_prefixes=MAX_PREFIXES, temperature=0.0):
+        super().__init__(model, tokenizer, max_prefixes, temperature)
+        from transformers import StoppingCriteriaList, TextStreamer
+
+        self.TextStreamer = TextStreamer
+        self.StoppingCriteriaList = StoppingCriteriaList
+
+    async def stream(self, prompt, max_new_tokens=50, prefix=None):
+        """
+        Async generator of text chunks for one prompt
+        """
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+        stop = threading.Event()
+
+        def put(text):
+            loop.call_soon_threadsafe(chunks.put_nowait, text)
+
+        streamer = self.TextStreamer(
+            self.tokenizer, skip_prompt=True, skip_special_tokens=True
+        )
+        streamer.on_finalized_text = lambda text, stream_end=False: put(text)
+        stopping_criteria = self.StoppingCriteriaList(
+            [lambda input_ids, scores, **kwargs: stop.is_set()]
+        )
+
+        def run():
+            try:
+                self.generate_one(
+                    prompt,
+                    prefix,
+                    max_new_tokens,
+                    streamer=streamer,
+                    stopping_criteria=stopping_criteria,
+                )
+            finally:
+                put(None)
+
+        generation = asyncio.ensure_future(asyncio.to_thread(run))
+        try:
+            while True:
+                text = await chunks.get()
+                if text is None:
+                    break
+                if text:
+                    yield text
+        finally:
+            # stop the model at its next token if the reader gave up early
+            stop.set()
+            await generation
+
+
+class InferenceScheduler:
+    """
+    Central queue for model requests from every fighter.
+
+    Prompts submitted within `batch_window` seconds of each other are run
+    through the model as one padded batch, and each result is handed back to
+    the fighter that asked for it. One scheduler can be shared by any number
+    of fighters and matches. When more prompts wait than fit in a batch,
+    each `source` that submitted them gets one place in turn, oldest first,
+    so a fighter that asks often can't crowd out the others. With a
+    DecisionCache, repeated prompts are answered from the cache without
+    waiting for a batch.
+    """
+
+    def __init__(
+        self,
+        generate,
+        batch_window=BATCH_WINDOW,
+        max_batch_size=MAX_BATCH_SIZE,
+        cache=None,
+    ):
+        self.generate = generate
+        self.cache = cache
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        # (prompt, prefix, max_new_tokens, future, submit time, source)
+        self.pending = []
+        self.worker = None
+        self.batches = 0
+        self.prompts = 0
+
+    @property
+    def ready(self):
+        # plain generate functions are always ready
+        return getattr(self.generate, "ready", True)
+
+    @property
+    def error(self):
+        return getattr(self.generate, "error", None)
+
+    async def submit(self, prompt, max_new_tokens=50, prefix=None, source=None):
+        """
+        Queue a prompt and return the generated text once its batch has run.
+        `prefix` is the static start of the prompt, for backends that cache it,
+        and `source` is who is asking, for sharing out places in a batch.
+        """
+        if self.cache is not None:
+            text = self.cache.lookup(prompt)
+            if text is not None:
+                return text
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append(
+            (prompt, prefix, max_new_tokens, future, time.perf_counter(), source)
+        )
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.create_task(self.run_batches())
+        return await future
+
+    async def run_batches(self):
+        while self.pending:
+            # give the other fighters a moment to submit their prompts
+            await asyncio.sleep(self.batch_window)
+
+            # skip requests that were cancelled while waiting
+            self.pending = [
+                request for request in self.pending if not request[3].done()
+            ]
+            batch = self.take_batch()
+            if not batch:
+                continue
+
+            start = time.perf_counter()
+            for _, _, _, _, submitted, _ in batch:
+                metrics.observe("llm.queue_wait", (start - submitted) * 1000)
+            metrics.observe("llm.batch_size", len(batch))
+
+            prompts = [request[0] for request in batch]
+            prefixes = [request[1] for request in batch]
+            max_new_tokens = max(request[2] for request in batch)
+            try:
+                texts = await asyncio.to_thread(
+                    self.generate, prompts, max_new_tokens, prefixes
+                )
+            except Exception as e:
+                for request in batch:
+                    if not request[3].done():
+                        request[3].set_exception(e)
+                continue
+            metrics.since("llm.generate", start)
+
+            self.batches += 1
+            self.prompts += len(batch)
+            for (prompt, _, _, future, _, _), text in zip(batch, texts):
+                if self.cache is not None:
+                    self.cache.store(prompt, text)
+                if not future.done():
+                    future.set_result(text)
+
+    def take_batch(self):
+        """
+        Remove and return the next batch from the pending requests
+        """
+        if len(self.pending) <= self.max_batch_size:
+            batch = self.pending
+            self.pending = []
+            return batch
+
+        # each source's requests in order, sources by their oldest request;
+        # requests without a source each count as their own
+        queues = {}
+        for request in self.pending:
+            source = request[5] if request[5] is not None else id(request)
+            queues.setdefault(source, []).append(request)
+        turns = [iter(requests) for requests in queues.values()]
+        batch = []
+        while len(batch) < self.max_batch_size:
+            for requests in turns:
+                request = next(requests, None)
+                if request is not None and len(batch) < self.max_batch_size:
+                    batch.append(request)
+        chosen = set(map(id, batch))
+        self.pending = [
+            request for request in self.pending if id(request) not in chosen
+        ]
+        # the batch keeps submission order
+        batch.sort(key=lambda request: request[4])
+        return batch
@@ -1,117 +1,262 @@
 import asyncio
+import contextlib
 import re
+import time
 
-import pygame
 from typing import Any
 
+from action_buffer import MAX_DEPTH, MAX_PLAN_AGE, ActionBuffer
+from controllers import Controller
+from fighter import MAX_HEALTH, SPEED
+from inference import InferenceScheduler
+from metrics import metrics
+
 VALID_ACTIONS = ["MOVE_CLOSER", "MOVE_AWAY", "HIGH_ATTACK", "LOW_ATTACK", "JUMP"]
-MAX_HEALTH = 100
 MODEL_COOLDOWN = 500
-class LLMFighter:
+# game time between a model request and its moves reaching the queue
+PLAN_DELAY = 500
+# how much older than the plan delay a planned move may get before it is
+# dropped, when the delay is longer than the queue's max_plan_age
+PLAN_AGE_MARGIN = 500
+# bounds for the cooldown when it follows the measured model latency
+MIN_MODEL_COOLDOWN = 100
+MAX_MODEL_COOLDOWN = 5000
+LATENCY_SMOOTHING = 0.2
+# outstanding model requests per fighter
+MAX_IN_FLIGHT = 1
+# a streamed plan stops generating once it has this many moves
+MOVES_PER_PLAN = 6
+# game time an anticipated plan aims to land before the queue runs out
+PREFETCH_MARGIN = 100
+# smoothing of the ticks per played action, moves per plan and the
+# opponent's speed
+PACE_SMOOTHING = 0.2
+# an anticipated plan is asked for while the one before is still in flight
+PREFETCH_IN_FLIGHT = 2
+
+
+class MoveParser:
+    """
+    Incremental parser for the model's bullet point list of moves.
+
+    Text can be fed in any chunks. A move is parsed as soon as its line is
+    complete, and `close()` parses whatever is left of the last line.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.text = ""  # everything fed so far
+        self.parsed = 0  # valid bullet points seen
+        self.moves = []  # valid moves as the model listed them
+        self.valid_moves = []  # the same, as queued
+        self.invalid_moves = []
+
+    def feed(self, text):
+        """
+        Return the valid moves from the lines completed by this text
+        """
+        self.text += text
+        self.buffer += text
+        *lines, self.buffer = self.buffer.split("\n")
+        return self.parse_lines(lines)
+
+    def close(self):
+        lines = [self.buffer]
+        self.buffer = ""
+        return self.parse_lines(lines)
+
+    def parse_lines(self, lines):
+        valid_moves = []
+        for line in lines:
+            # The response is a bullet point list of moves. Use regex
+            for move in re.findall(r"- ([\w ]+)", line):
+                if move in VALID_ACTIONS:
+                    self.parsed += 1
+                    self.moves.append(move)
+                    valid_moves.append(move)
+                    # IF move left or right add 4 more moves
+                    if move == "MOVE_CLOSER" or move == "MOVE_AWAY":
+                        valid_moves.extend([move] * 4)
+                else:
+                    self.invalid_moves.append(move)
+        self.valid_moves.extend(valid_moves)
+        return valid_moves
+
+
+class LLMController(Controller):
+    """
+    Plays a fighter from the moves a language model suggests.
+
+    Every `model_cooldown` ms of game time the controller sends the game
+    state to the backend, and the parsed moves go into an action queue that
+    the fighter plays one move per tick. A plan is due `plan_delay` ms after
+    its request. Without `adaptive_cooldown` the match waits for a late
+    model at the due tick, so it replays exactly; otherwise the plan lands
+    on the first tick it is both due and ready, unless the match is running
+    ahead of the wall clock, where waiting stalls nothing the player sees.
+
+    With `anticipate` the cadence follows the queue instead. The controller
+    tracks how many ticks the queued moves, and the plans still in flight,
+    will cover, from how fast the fighter has been playing its moves and
+    how long its plans are. It asks for the next plan once that is no more
+    than the time a plan takes to land, even while the last one is still in
+    flight, and the prompt describes where the fighters are expected to be
+    when the plan lands rather than where they are now.
+    """
+
     def __init__(
         self,
-        player,
-        x,
-        y,
-        flip,
-        data,
-        sprite_sheet,
-        animation_steps,
         model,
         system_prompt,
         llm_pipeline: Any,
+        clock,
+        max_in_flight=MAX_IN_FLIGHT,
+        adaptive_cooldown=True,
+        max_queue_depth=MAX_DEPTH,
+        max_plan_age=MAX_PLAN_AGE,
+        anticipate=False,
     ):
-        self.player = player
-        self.size = data[0]
-        self.image_scale = data[1]
-        self.offset = data[2]
-        self.flip = flip
-        self.animation_list = self.load_images(sprite_sheet, animation_steps)
-        self.action = 0  # 0:idle #1:run #2:jump #3:attack1 #4: attack2 #5:hit #6:death
-        self.frame_index = 0
-        self.image = self.animation_list[self.action][self.frame_index]
-        self.update_time = pygame.time.get_ticks()
-        self.rect = pygame.Rect((x, y, 80, 180))
-        self.vel_y = 0
-        self.running = False
-        self.jump = False
-        self.attacking = False
-        self.attack_type = 0
-        self.attack_cooldown = 0
-        self.hit = False
-        self.health = MAX_HEALTH
-        self.alive = True
+        super().__init__()
         self.model = model
+        self.name = model
         self.system_prompt = system_prompt
         self.llm_pipeline = llm_pipeline
-        self.last_action = None
-        self.action_queue = []
+        self.clock = clock
+        self.static_prompt = self.get_static_prompt()
+        self.max_plan_age = max_plan_age
+        self.action_queue = ActionBuffer(
+            clock, max_queue_depth, max(max_plan_age, PLAN_DELAY + PLAN_AGE_MARGIN)
+        )
         self.last_model_call_time = None
-
-    def load_images(self, sprite_sheet, animation_steps):
-        # extract images from spritesheet
-        animation_list = []
-        for y, animation in enumerate(animation_steps):
-            temp_img_list = []
-            for x in range(animation):
-                temp_img = sprite_sheet.subsurface(
-                    x * self.size, y * self.size, self.size, self.size
-                )
-                temp_img_list.append(
-                    pygame.transform.scale(
-                        temp_img,
-                        (self.size * self.image_scale, self.size * self.image_scale),
-                    )
-                )
-            animation_list.append(temp_img_list)
-        return animation_list
+        # (request tick, due tick, task, wall time of the request) in
+        # request order
+        self.pending_plans = []
+        self.max_in_flight = max_in_flight
+        self.adaptive_cooldown = adaptive_cooldown
+        self.model_cooldown = MODEL_COOLDOWN
+        self.plan_delay = PLAN_DELAY
+        self.model_latency = None  # smoothed ms per request
+        self.anticipate = anticipate
+        self.ticks_per_action = 1.0  # smoothed ticks between played actions
+        self.plan_length = None  # smoothed moves per plan
+        self.last_pop_tick = None
+        self.target_velocity = 0.0  # smoothed opponent pixels per tick
+        self.last_target_x = None
+
+    @property
+    def ready(self):
+        return self.llm_pipeline.ready
+
+    @property
+    def error(self):
+        return self.llm_pipeline.error
 
     async def add_llm_actions_to_queue(self, full_system_prompt):
+        valid_moves = await self.get_llm_actions(full_system_prompt)
+        self.action_queue.extend(valid_moves)
+        return valid_moves
+
+    async def get_llm_actions(self, full_system_prompt, request_tick=None):
 
         prompt = f"{full_system_prompt}\nYour next moves are:"
+        parser = MoveParser()
 
-        # Run the Hugging Face model in a separate thread
-        result = await asyncio.to_thread(
-            self.llm_pipeline,
-            prompt,
-            max_new_tokens=50,
-        )
+        start = time.perf_counter()
+        if isinstance(self.llm_pipeline, InferenceScheduler):
+            # batched with the other fighters' prompts
+            actions_text = await self.llm_pipeline.submit(
+                prompt, max_new_tokens=50, prefix=self.static_prompt, source=self
+            )
+        elif self.llm_pipeline.streaming:
+            valid_moves = await self.stream_llm_actions(prompt, parser, request_tick)
+            self.record_response(parser, start, request_tick, prompt)
+            return valid_moves
+        else:
+            # Run the backend in a separate thread
+            texts = await asyncio.to_thread(
+                self.llm_pipeline.generate, [prompt], 50, [self.static_prompt]
+            )
+            actions_text = texts[0]
 
-        actions_text = result[0]["generated_text"][len(prompt) :]
+        parser.feed(actions_text)
+        parser.close()
+        self.record_response(parser, start, request_tick, prompt)
 
-        print(f"{self.model} response:")
-        print(actions_text)
+        return parser.valid_moves
 
-        # The response is a bullet point list of moves. Use regex
-        matches = re.findall(r"- ([\w ]+)", actions_text)
-        moves = ["".join(match) for match in matches]
-        invalid_moves = []
-        valid_moves = []
+    def record_response(self, parser, start, request_tick, prompt):
+        latency = (time.perf_counter() - start) * 1000
+        self.record_latency(latency)
+        metrics.observe("llm.latency", latency)
+        if self.plan_length is None:
+            self.plan_length = len(parser.valid_moves)
+        else:
+            self.plan_length += PACE_SMOOTHING * (
+                len(parser.valid_moves) - self.plan_length
+            )
+        metrics.count("moves.parsed", parser.parsed)
+        metrics.count("moves.invalid", len(parser.invalid_moves))
+        metrics.write(
+            "response",
+            player=self.fighter.player,
+            model=self.model,
+            tick=request_tick,
+            latency_ms=latency,
+            parsed=parser.parsed,
+            invalid=parser.invalid_moves,
+            text=parser.text,
+        )
+        if self.on_response is not None:
+            self.on_response(
+                self.fighter, request_tick, prompt, parser.text, parser.moves
+            )
 
-        # add valid moves to action queue
-        for move in moves:
-            if move in VALID_ACTIONS:
-                valid_moves.append(move)
-                # IF move left or right add 2 more moves
-                if move == "MOVE_CLOSER" or move == "MOVE_AWAY":
-                    valid_moves.append(move)
-                    valid_moves.append(move)
-                    valid_moves.append(move)
-                    valid_moves.append(move)
+    async def stream_llm_actions(self, prompt, parser, request_tick):
+        """
+        Parse the moves while the model is still generating and stop it once
+        the plan is long enough. Unless the fighter must replay exactly, each
+        move goes into the queue as soon as its line is complete, and nothing
+        is left to deliver at the plan's due tick.
+        """
+        live = self.adaptive_cooldown
+        first_moves = True
+
+        def push(moves):
+            nonlocal first_moves
+            if not live or not moves:
+                return
+            # the first moves of a new plan replace the old one
+            if first_moves:
+                self.action_queue.replace(moves, request_tick)
+                first_moves = False
             else:
-                invalid_moves.append(move)
+                self.action_queue.extend(moves, request_tick)
+            self.plan_arrived(request_tick, moves)
 
-        self.action_queue.extend(valid_moves)
-
-        return valid_moves
-
-    def context_prompt(self, target) -> str:
+        chunks = self.llm_pipeline.stream(
+            prompt, max_new_tokens=50, prefix=self.static_prompt
+        )
+        async with contextlib.aclosing(chunks):
+            async for chunk in chunks:
+                push(parser.feed(chunk))
+                if parser.parsed >= MOVES_PER_PLAN:
+                    break
+        push(parser.close())
+
+        if live:
+            return []
+        return parser.valid_moves
+
+    def context_prompt(self, target, projection=None) -> str:
         """
-        Return a str of the context
+        Return a str of the context, with the fighters at the x positions in
+        `projection` if one is given
         """
 
-        # get distance from self.x and target.x
-        distance = abs(self.rect.x - target.rect.x)
+        fighter = self.fighter
+        x, target_x = projection or (fighter.rect.x, target.rect.x)
+        # get distance from x and target_x
+        distance = abs(x - target_x)
         # print(f"distance: {distance}")
 
         position_prompt = ""
@@ -119,7 +264,7 @@ class LLMFighter:
             position_prompt += (
                 "You are very far from the opponent. Move closer to the opponent."
             )
-            if target.rect.x > self.rect.x:
+            if target_x > x:
                 position_prompt += "Your opponent is on the right."
             else:
                 position_prompt += "Your opponent is on the left."
@@ -130,17 +275,17 @@ class LLMFighter:
         # Create the last action prompt
         last_action_prompt = ""
 
-        if self.last_action is not None:
-            last_action_prompt += f"Your last action was {self.last_action}."
+        if fighter.last_action is not None:
+            last_action_prompt += f"Your last action was {fighter.last_action}."
 
         if target.last_action is not None:
             last_action_prompt += f"Your last action was {target.last_action}."
 
         # Check who was more health
         score_prompt = ""
-        if self.health > target.health:
+        if fighter.health > target.health:
             score_prompt += "You are winning. Keep attacking the opponent."
-        elif self.health < target.health:
+        elif fighter.health < target.health:
             score_prompt += (
                 "You are losing. Continue to attack the opponent but don't get hit."
             )
@@ -149,17 +294,20 @@ class LLMFighter:
 
         # Assemble everything
         context = f"""{position_prompt}{last_action_prompt}
-Your health is {self.health}/{MAX_HEALTH}. {score_prompt}
+Your health is {fighter.health}/{MAX_HEALTH}. {score_prompt}
 You can win by getting your opponent health to 0. To prevent your health from decreasing, don't get hit by the opponent.
 """
 
         return context
 
-    def get_game_state_prompt(self, target):
+    def get_static_prompt(self):
+        """
+        Return the part of the prompt that never changes for this fighter.
+        It comes first so a backend can cache the model state for it.
+        """
 
-        full_system_prompt = f"""
+        static_prompt = f"""
 You are playing a 2d Fighting game. {self.system_prompt}. Your goal is to beat the other opponent. You respond with a bullet point list of moves.
-{self.context_prompt(target)}
 The moves you can use are:
 {VALID_ACTIONS}
 ----
@@ -172,196 +320,207 @@ Example if the opponent is far away:
 - MOVE_CLOSER
 - MOVE_CLOSER
 - LOW_ATTACK
+----
 """
 
+        return static_prompt
+
+    def get_game_state_prompt(self, target):
+
+        projection = self.project(target) if self.anticipate else None
+        full_system_prompt = self.static_prompt + self.context_prompt(
+            target, projection
+        )
+
         # print(full_system_prompt)
 
         return full_system_prompt
 
+    def record_latency(self, latency):
+        if self.model_latency is None:
+            self.model_latency = latency
+        else:
+            self.model_latency += LATENCY_SMOOTHING * (latency - self.model_latency)
+
+        # ask again about as often as the model can answer
+        if self.adaptive_cooldown:
+            self.model_cooldown = min(
+                max(self.model_latency, MIN_MODEL_COOLDOWN), MAX_MODEL_COOLDOWN
+            )
+            self.plan_delay = self.model_cooldown
+            # a plan that is slow to land must not be stale on arrival
+            self.action_queue.max_age = max(
+                self.max_plan_age, self.plan_delay + PLAN_AGE_MARGIN
+            )
+
     def start_llm_request(self, full_system_prompt):
-        asyncio.create_task(self.add_llm_actions_to_queue(full_system_prompt))
-
-    async def move(self, screen_width, screen_height, target, round_over):
-        SPEED = 10
-        GRAVITY = 2
-        dx = 0
-        dy = 0
-        self.running = False
-        self.attack_type = 0
-
-        # Check if time to call model again
-        if self.last_model_call_time is None and round_over == False:
-            # get game state
-            full_system_prompt = self.get_game_state_prompt(target)
-            self.last_model_call_time = pygame.time.get_ticks()
-            # Add to queue
-            # await self.add_llm_actions_to_queue(full_system_prompt)
-            self.start_llm_request(full_system_prompt)
-        elif (
-            pygame.time.get_ticks() - self.last_model_call_time > MODEL_COOLDOWN
-            and round_over == False
+        # the moves are held back until a fixed number of ticks has passed, so
+        # they land on the same tick however long the model takes
+        task = asyncio.create_task(
+            self.get_llm_actions(full_system_prompt, self.clock.tick)
+        )
+        due_tick = self.clock.tick + self.clock.ticks(self.plan_delay)
+        self.pending_plans.append(
+            (self.clock.tick, due_tick, task, time.perf_counter())
+        )
+
+    def cancel(self):
+        for _, _, task, _ in self.pending_plans:
+            task.cancel()
+        self.pending_plans = []
+
+    def plan_arrived(self, request_tick, moves):
+        if self.on_plan is not None:
+            self.on_plan(self.fighter, request_tick, moves)
+
+    async def deliver_plans(self):
+        while self.pending_plans and self.pending_plans[0][1] <= self.clock.tick:
+            request_tick, _, task, requested_at = self.pending_plans[0]
+            # a match that must replay exactly waits for a late model rather
+            # than let its speed change the match, and so does an uncapped
+            # one, which would otherwise race past the plan. A match paced
+            # in real time takes the plan on the first tick after it is
+            # ready, so the game loop never stalls on the model.
+            if (
+                not task.done()
+                and self.adaptive_cooldown
+                and not self.running_ahead(request_tick, requested_at)
+            ):
+                break
+            self.pending_plans.pop(0)
+            try:
+                valid_moves = await task
+            except Exception as e:
+                metrics.count("llm.errors")
+                metrics.write(
+                    "error",
+                    player=self.fighter.player,
+                    model=self.model,
+                    tick=request_tick,
+                    error=repr(e),
+                )
+                continue
+            # a newer plan replaces whatever is left of the older one
+            if valid_moves:
+                self.action_queue.replace(valid_moves, request_tick)
+                self.plan_arrived(request_tick, valid_moves)
+
+    def running_ahead(self, request_tick, requested_at):
+        """
+        Return whether more game time than wall time has passed since a
+        request, as in a match that isn't paced in real time
+        """
+        wall_ms = (time.perf_counter() - requested_at) * 1000
+        return self.clock.ms(self.clock.tick - request_tick) > 2 * wall_ms
+
+    async def poll(self, target, round_over):
+        # Check if time to call model again. While too many requests are
+        # still in flight the call is put off, so the next one carries the
+        # newest game state instead of piling up behind a slow model. Until
+        # the model has loaded the fighter just stands still.
+        if self.anticipate:
+            self.track_target(target)
+        if (
+            round_over == False
+            and self.ready
+            and len(self.pending_plans) < self.in_flight_limit()
+            and self.plan_wanted()
         ):
             # get game state
             full_system_prompt = self.get_game_state_prompt(target)
-            self.last_model_call_time = pygame.time.get_ticks()
+            self.last_model_call_time = self.clock.tick
             # Add to queue
             # await self.add_llm_actions_to_queue(full_system_prompt)
             self.start_llm_request(full_system_prompt)
 
-        # if round over clear actions
+        await self.deliver_plans()
+
+        # if round over clear actions and drop outstanding requests
         if round_over == True:
-            self.action_queue = []
+            self.action_queue.clear()
+            self.cancel()
+
+    def in_flight_limit(self):
+        if self.anticipate:
+            return max(self.max_in_flight, PREFETCH_IN_FLIGHT)
+        return self.max_in_flight
+
+    def plan_wanted(self):
+        if self.last_model_call_time is None:
+            return True
+        since_call = self.clock.tick - self.last_model_call_time
+        if self.anticipate:
+            return (
+                since_call > self.clock.ticks(MIN_MODEL_COOLDOWN)
+                and self.planned_ticks() <= self.plan_lead()
+            )
+        return since_call > self.clock.ticks(self.model_cooldown)
 
-        # can only perform other actions if not currently attacking
-        if self.attacking == False and self.alive == True and round_over == False:
+    def planned_ticks(self):
+        """
+        Return the ticks until the fighter runs out of planned actions. A
+        plan in flight replaces the queue when it lands, so the last one
+        decides, with the length plans have had so far.
+        """
+        if not self.pending_plans or self.plan_length is None:
+            return self.queue_coverage()
+        request_tick, due_tick, _, _ = self.pending_plans[-1]
+        # the plan goes stale the queue's max_age after its request
+        fresh = request_tick + self.clock.ticks(self.action_queue.max_age) - due_tick
+        playing = self.plan_length * self.ticks_per_action
+        return max(due_tick - self.clock.tick, 0) + min(playing, fresh)
+
+    def plan_lead(self):
+        """
+        Return the ticks between asking for a plan and it reaching the queue
+        """
+        return self.clock.ticks(self.plan_delay + PREFETCH_MARGIN)
 
-            if len(self.action_queue) == 0:
-                action = "NOOP"
-            else:
-                # print("action queue: ", self.action_queue)
-                action = self.action_queue.pop(0)
+    def queue_coverage(self):
+        """
+        Return the ticks until the fighter runs out of queued actions
+        """
+        playing = len(self.action_queue) * self.ticks_per_action
+        return min(playing, self.action_queue.fresh_ticks())
 
-            # movement
-            if action == "MOVE_CLOSER":
+    def track_target(self, target):
+        if self.last_target_x is not None:
+            dx = target.rect.x - self.last_target_x
+            self.target_velocity += PACE_SMOOTHING * (dx - self.target_velocity)
+        self.last_target_x = target.rect.x
 
-                # if target is on the left move left
-                if target.rect.x > self.rect.x:
-                    dx = SPEED
-                    self.running = True
-                else:
-                    dx = -SPEED
-                    self.running = True
-            if action == "MOVE_AWAY ":
-                # if target is on the left move right
-                if target.rect.x > self.rect.x:
-                    dx = SPEED
-                    self.running = True
-                else:
-                    dx = -SPEED
-                    self.running = True
-                # dx = SPEED
-                # self.running = True
-            # jump
-            if action == "JUMP" and self.jump == False:
-                self.vel_y = -30
-                self.jump = True
-            # attack
-            if action == "HIGH_ATTACK" or action == "LOW_ATTACK":
-                self.attack(target)
-                # determine which attack type was used
-                if action == "HIGH_ATTACK":
-                    self.attack_type = 1
-                if action == "LOW_ATTACK":
-                    self.attack_type = 2
-
-        # apply gravity
-        self.vel_y += GRAVITY
-        dy += self.vel_y
-
-        # ensure player stays on screen
-        if self.rect.left + dx < 0:
-            dx = -self.rect.left
-        if self.rect.right + dx > screen_width:
-            dx = screen_width - self.rect.right
-        if self.rect.bottom + dy > screen_height - 110:
-            self.vel_y = 0
-            self.jump = False
-            dy = screen_height - 110 - self.rect.bottom
-
-        # ensure players face each other
-        if target.rect.centerx > self.rect.centerx:
-            self.flip = False
-        else:
-            self.flip = True
-
-        # apply attack cooldown
-        if self.attack_cooldown > 0:
-            self.attack_cooldown -= 1
-
-        # update player position
-        self.rect.x += dx
-        self.rect.y += dy
-
-    # handle animation updates
-    def update(self):
-        # check what action the player is performing
-        if self.health <= 0:
-            self.health = 0
-            self.alive = False
-            self.update_action(6)  # 6:death
-        elif self.hit == True:
-            self.update_action(5)  # 5:hit
-        elif self.attacking == True:
-            if self.attack_type == 1:
-                self.update_action(3)  # 3:attack1
-            elif self.attack_type == 2:
-                self.update_action(4)  # 4:attack2
-        elif self.jump == True:
-            self.update_action(2)  # 2:jump
-        elif self.running == True:
-            self.update_action(1)  # 1:run
-        else:
-            self.update_action(0)  # 0:idle
-
-        animation_cooldown = 50
-        # update image
-        self.image = self.animation_list[self.action][self.frame_index]
-        # check if enough time has passed since the last update
-        if pygame.time.get_ticks() - self.update_time > animation_cooldown:
-            self.frame_index += 1
-            self.update_time = pygame.time.get_ticks()
-        # check if the animation has finished
-        if self.frame_index >= len(self.animation_list[self.action]):
-            # if the player is dead then end the animation
-            if self.alive == False:
-                self.frame_index = len(self.animation_list[self.action]) - 1
-            else:
-                self.frame_index = 0
-                # check if an attack was executed
-                if self.action == 3 or self.action == 4:
-                    self.attacking = False
-                    self.attack_cooldown = 20
-                # check if damage was taken
-                if self.action == 5:
-                    self.hit = False
-                    # if the player was in the middle of an attack, then the attack is stopped
-                    self.attacking = False
-                    self.attack_cooldown = 20
-
-    def attack(self, target):
-        if self.attack_cooldown == 0:
-            # execute attack
-            self.attacking = True
-            # self.attack_sound.play()
-            attacking_rect = pygame.Rect(
-                self.rect.centerx - (2 * self.rect.width * self.flip),
-                self.rect.y,
-                2 * self.rect.width,
-                self.rect.height,
-            )
-            if attacking_rect.colliderect(target.rect):
-                target.health -= 10
-                target.hit = True
-                # move target back on x axis based on oppside side they are facing
-                if self.flip == True:
-                    target.rect.x -= 150
-                else:
-                    target.rect.x += 150
-
-    def update_action(self, new_action):
-        # check if the new action is different to the previous one
-        if new_action != self.action:
-            self.action = new_action
-            # update the animation settings
-            self.frame_index = 0
-            self.update_time = pygame.time.get_ticks()
-
-    def draw(self, surface):
-        img = pygame.transform.flip(self.image, self.flip, False)
-        surface.blit(
-            img,
-            (
-                self.rect.x - (self.offset[0] * self.image_scale),
-                self.rect.y - (self.offset[1] * self.image_scale),
-            ),
-        )
+    def project(self, target):
+        """
+        Return the x positions of the fighter and its target when a plan
+        asked for now lands: the fighter plays on through its queue and the
+        target keeps its recent speed
+        """
+        lead = self.plan_lead()
+        x = self.fighter.rect.x
+        target_x = target.rect.x
+        played = min(len(self.action_queue), int(lead / self.ticks_per_action))
+        for action in self.action_queue.peek(played):
+            if action == "MOVE_CLOSER":
+                x += SPEED if target_x > x else -SPEED
+        target_x += round(self.target_velocity * lead)
+        return x, target_x
+
+    def next_actions(self, target):
+        # stale actions are dropped on the way out
+        metrics.observe("queue.depth", len(self.action_queue))
+        action = self.action_queue.pop()
+        if action is None:
+            # free to act with nothing planned
+            metrics.count("queue.empty")
+            self.last_pop_tick = None
+            return ()
+        # attacks hold the fighter, so actions play slower than one a tick
+        tick = self.clock.tick
+        if self.last_pop_tick is not None:
+            interval = tick - self.last_pop_tick
+            self.ticks_per_action += PACE_SMOOTHING * (interval - self.ticks_per_action)
+        self.last_pop_tick = tick
+        return (action,)
+
+    def peek(self, count):
+        return self.action_queue.peek(count)
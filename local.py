@@ -1,298 +1,301 @@
+import argparse
 import asyncio
 import pygame
-from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
 
-# from fighter import Fighter
-from llm_fighter import LLMFighter
+from controllers import KeyboardController
+from engine import Match, fighter_pair, llm_fighters
+from decision_cache import DecisionCache
+from backends import HTTPBackend, LazyBackend, MockBackend
+from inference import (
+    PRECISIONS,
+    SAMPLING_TEMPERATURE,
+    InferenceScheduler,
+    load_backend,
+)
+from llm_fighter import VALID_ACTIONS, LLMController
+from metrics import metrics
+from replay import ReplayMatch, ReplayReader, ReplayRecorder
+
+# Hugging Face model
+MODEL_NAME = "bigscience/bloom-560m"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Model Brawl League")
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="run the match without a window and without the frame cap",
+    )
+    parser.add_argument(
+        "--rounds",
+        type=int,
+        default=None,
+        help="stop after this many rounds (default: play forever)",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="random seed for the mock backend, the model's sampling and the "
+        "decision cache's choices, so matches can be replayed exactly",
+    )
+    parser.add_argument(
+        "--deterministic",
+        action="store_true",
+        help="keep the fixed model cooldown instead of following model latency, "
+        "so the same seed always plays the same match",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["transformers", "http", "mock"],
+        default="transformers",
+        help="run the model in this process, on a model server, or replace it "
+        "with random valid moves",
+    )
+    parser.add_argument(
+        "--server-url",
+        default="http://127.0.0.1:8080",
+        help="model server for --backend http",
+    )
+    parser.add_argument(
+        "--server-api",
+        choices=["openai", "tgi"],
+        default="openai",
+        help="OpenAI-compatible /v1/completions or TGI-style /generate",
+    )
+    parser.add_argument(
+        "--precision",
+        choices=PRECISIONS,
+        default="fp32",
+        help="weight format for the in-process model: bf16 halves the weights, "
+        "int8 quantizes the linear layers",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="torch threads for the in-process model (default: torch's choice)",
+    )
+    parser.add_argument(
+        "--prefix-cache",
+        action="store_true",
+        help="cache the model state for the static part of each prompt "
+        "instead of batching both fighters' prompts",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="stream each generation and act on moves as soon as they are parsed",
+    )
+    parser.add_argument(
+        "--constrained",
+        action="store_true",
+        help="only let the model answer with moves from VALID_ACTIONS",
+    )
+    parser.add_argument(
+        "--decision-cache",
+        type=int,
+        default=0,
+        metavar="SAMPLES",
+        help="answer repeated game states from a cache holding this many "
+        "answers per state, sampled so they differ (default: off; not with "
+        "--stream)",
+    )
+    parser.add_argument(
+        "--anticipate",
+        action="store_true",
+        help="ask for each plan early enough to land as the last one runs out, "
+        "instead of on a fixed cadence",
+    )
+    parser.add_argument(
+        "--human",
+        action="store_true",
+        help="play player 1 on the keyboard (WASD, R and T) against the model",
+    )
+    parser.add_argument(
+        "--record",
+        metavar="PATH",
+        help="record every tick of the match and the plans the fighters get",
+    )
+    parser.add_argument(
+        "--replay",
+        metavar="PATH",
+        help="play back a recorded match instead of playing one",
+    )
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="replay speed, in recorded ticks per frame (negative plays backwards)",
+    )
+    parser.add_argument(
+        "--start",
+        type=int,
+        default=0,
+        help="game tick to start the replay from",
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="PATH",
+        help="append model responses and a metrics summary every second of "
+        "game time to this JSON-lines file",
+    )
+    parser.add_argument(
+        "--show-metrics",
+        action="store_true",
+        help="start with the metrics overlay on (F3 toggles it)",
+    )
+    args = parser.parse_args()
+    if args.stream and args.decision_cache:
+        # streamed prompts go straight to the backend, past the cache
+        parser.error("--decision-cache can't be used with --stream")
+    return args
+
+
+def replay(args):
+    # no model is needed to watch a recording
+    from renderer import Renderer
+
+    renderer = Renderer(show_metrics=args.show_metrics)
+    reader = ReplayReader(args.replay)
+    match = ReplayMatch(
+        reader,
+        renderer.warrior_sheet,
+        renderer.wizard_sheet,
+        observers=[renderer],
+        speed=args.speed,
+    )
+    match.seek(args.start)
+    score = match.run()
+    print(f"replayed score: P1 {score[0]} - P2 {score[1]}")
+    reader.close()
 
 
 async def main():
+    args = parse_args()
 
     pygame.init()
-
-    # create game window
-    GAME_WIDTH = 1000
-    GAME_HEIGHT = 600
-    BORDER_LEFT = 200
-    BORDER_RIGHT = 200
-    BORDER_TOP = 50
-    BORDER_BOTTOM = 150
-    SCREEN_WIDTH = GAME_WIDTH + BORDER_LEFT + BORDER_RIGHT
-    SCREEN_HEIGHT = GAME_HEIGHT + BORDER_TOP + BORDER_BOTTOM
-
-    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-    pygame.display.set_caption("Model Brawl League")
-    game_surface = pygame.Surface((GAME_WIDTH, GAME_HEIGHT))
-
-    # set framerate
-    clock = pygame.time.Clock()
-    FPS = 60
-
-    # define colours
-    RED = (255, 0, 0)
-    YELLOW = (255, 255, 0)
-    WHITE = (255, 255, 255)
-
-    # define game variables
-    intro_count = 3
-    last_count_update = pygame.time.get_ticks()
-    score = [0, 0]  # player scores. [P1, P2]
-    round_over = False
-    ROUND_OVER_COOLDOWN = 2000
-
-    # define fighter variables
-    WARRIOR_SIZE = 162
-    WARRIOR_SCALE = 4
-    WARRIOR_OFFSET = [72, 56]
-    WARRIOR_DATA = [WARRIOR_SIZE, WARRIOR_SCALE, WARRIOR_OFFSET]
-    WIZARD_SIZE = 250
-    WIZARD_SCALE = 3
-    WIZARD_OFFSET = [112, 107]
-    WIZARD_DATA = [WIZARD_SIZE, WIZARD_SCALE, WIZARD_OFFSET]
-
-    # load background image
-    bg_image = pygame.image.load(
-        "assets/images/background/background.jpg"
-    ).convert_alpha()
-
-    # load spritesheets
-    warrior_sheet = pygame.image.load(
-        "assets/images/warrior/Sprites/warrior.png"
-    ).convert_alpha()
-    wizard_sheet = pygame.image.load(
-        "assets/images/wizard/Sprites/wizard.png"
-    ).convert_alpha()
-
-    # load vicory image
-    victory_img = pygame.image.load("assets/images/icons/victory.png").convert_alpha()
-
-    # define number of steps in each animation
-    WARRIOR_ANIMATION_STEPS = [10, 8, 1, 7, 7, 3, 7]
-    WIZARD_ANIMATION_STEPS = [8, 8, 1, 8, 8, 3, 7]
-
-    # define font
-    count_font = pygame.font.Font("assets/fonts/turok.ttf", 80)
-    score_font = pygame.font.Font("assets/fonts/turok.ttf", 30)
-
-    # function for drawing text
-    def draw_text(surface, text, font, text_col, x, y):
-        img = font.render(text, True, text_col)
-        surface.blit(img, (x, y))
-
-    # function for drawing background
-    def draw_bg(surface):
-        scaled_bg = pygame.transform.scale(bg_image, (GAME_WIDTH, GAME_HEIGHT))
-        surface.blit(scaled_bg, (0, 0))
-
-    # function for drawing fighter health bars
-    def draw_health_bar(surface, health, x, y):
-        ratio = health / 100
-        pygame.draw.rect(surface, WHITE, (x - 2, y - 2, 404, 34))
-        pygame.draw.rect(surface, RED, (x, y, 400, 30))
-        pygame.draw.rect(surface, YELLOW, (x, y, 400 * ratio, 30))
-
-    def draw_timer(surface, timer, x, y):
-
-        if timer <= 0:
-            timer = 0
-
-        draw_text(surface, f"{timer}", count_font, RED, x, y)
-
-    action_font = pygame.font.Font("assets/fonts/turok.ttf", 20)
-
-    def draw_actions(surface, fighter, x):
-        draw_text(surface, "Moves:", action_font, WHITE, x, BORDER_TOP)
-        if fighter.action_queue:
-            for i, action in enumerate(fighter.action_queue[:5]):
-                draw_text(
-                    surface,
-                    f"- {action}",
-                    action_font,
-                    WHITE,
-                    x,
-                    BORDER_TOP + 25 + i * 20,
-                )
-        else:
-            draw_text(surface, "No actions", action_font, WHITE, x, BORDER_TOP + 25)
-
-    # Load Hugging Face model
-    MODEL_NAME = "bigscience/bloom-560m"
-    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-    hf_model = AutoModelForCausalLM.from_pretrained(MODEL_NAME)
-    llm = pipeline("text-generation", model=hf_model, tokenizer=tokenizer)
+    if args.metrics:
+        metrics.export(args.metrics)
+
+    if args.replay:
+        replay(args)
+        pygame.quit()
+        return
+    if args.human and args.headless:
+        raise SystemExit("--human needs a window")
+
+    if args.backend == "http":
+        backend = HTTPBackend(args.server_url, model=MODEL_NAME, api=args.server_api)
+    elif args.backend == "mock":
+        backend = MockBackend(VALID_ACTIONS, seed=args.seed)
+    else:
+        # a cache of several answers per state needs answers that differ
+        temperature = SAMPLING_TEMPERATURE if args.decision_cache > 1 else 0.0
+
+        def load(timings):
+            backend = load_backend(
+                MODEL_NAME,
+                prefix_cache=args.prefix_cache,
+                streaming=args.stream,
+                constrained_actions=VALID_ACTIONS if args.constrained else None,
+                timings=timings,
+                precision=args.precision,
+                threads=args.threads,
+                temperature=temperature,
+            )
+            from transformers import set_seed
+
+            set_seed(args.seed)
+            return backend
+
+        # Load Hugging Face model in the background while the game starts
+        backend = LazyBackend(load, streaming=args.stream).start()
+    if backend.streaming:
+        # streamed prompts skip the batching scheduler, and the generator
+        # runs the fighters' streams one after another
+        llm = backend
+    else:
+        # both fighters share one scheduler so their prompts run as one batch
+        cache = None
+        if args.decision_cache:
+            cache = DecisionCache(samples=args.decision_cache, seed=args.seed)
+        llm = InferenceScheduler(backend, cache=cache)
 
     model_1 = MODEL_NAME
     system_prompt_1 = "You are a very defensive player"
-    display_name_1 = model_1
 
     model_2 = MODEL_NAME
     system_prompt_2 = "You are a very aggressive player"
-    display_name_2 = model_2
 
-    fighter_1 = LLMFighter(
-        1,
-        200,
-        310,
-        False,
-        WARRIOR_DATA,
-        warrior_sheet,
-        WARRIOR_ANIMATION_STEPS,
-        model_1,
-        system_prompt_1,
-        llm,
-    )
-
-    fighter_2 = LLMFighter(
-        2,
-        700,
-        310,
-        True,
-        WIZARD_DATA,
-        wizard_sheet,
-        WIZARD_ANIMATION_STEPS,
-        model_2,
-        system_prompt_2,
-        llm,
-    )
-
-    # game loop
-    run = True
-    timer = 99
-    while run:
-
-        clock.tick(FPS)
-
-        # draw background
-        draw_bg(game_surface)
-
-        # show player stats
-        draw_health_bar(game_surface, fighter_1.health, 20, 20)
-        draw_health_bar(game_surface, fighter_2.health, 580, 20)
-        draw_text(
-            game_surface,
-            f"P1: {display_name_1} " + str(score[0]),
-            score_font,
-            RED,
-            20,
-            60,
-        )
-        draw_text(
-            game_surface,
-            f"P2: {display_name_2} " + str(score[1]),
-            score_font,
-            RED,
-            580,
-            60,
+    if args.headless:
+        # nothing to show while loading, so play from a loaded model
+        if isinstance(backend, LazyBackend):
+            await backend.wait()
+        make_fighters = llm_fighters(
+            model_1,
+            system_prompt_1,
+            model_2,
+            system_prompt_2,
+            llm,
+            adaptive_cooldown=not args.deterministic,
+            anticipate=args.anticipate,
         )
-        draw_timer(game_surface, timer, 460, 10)
-
-        # update countdown
-        if intro_count <= 0:
-            # move fighters
-            await fighter_1.move(GAME_WIDTH, GAME_HEIGHT, fighter_2, round_over)
-            await fighter_2.move(GAME_WIDTH, GAME_HEIGHT, fighter_1, round_over)
-        else:
-            # display count timer
-            draw_text(
-                game_surface,
-                str(intro_count),
-                count_font,
-                RED,
-                GAME_WIDTH / 2,
-                GAME_HEIGHT / 3,
-            )
-            # update count timer
-            if (pygame.time.get_ticks() - last_count_update) >= 1000:
-                intro_count -= 1
-                last_count_update = pygame.time.get_ticks()
-
-        # update fighters
-        fighter_1.update()
-        fighter_2.update()
-
-        # draw fighters
-        fighter_1.draw(game_surface)
-        fighter_2.draw(game_surface)
-
-        # check for player defeat
-        if round_over == False:
-            if fighter_1.alive == False:
-                score[1] += 1
-                round_over = True
-                round_over_time = pygame.time.get_ticks()
-            elif fighter_2.alive == False:
-                score[0] += 1
-                round_over = True
-                round_over_time = pygame.time.get_ticks()
-
-            if timer == 0:
-                if fighter_1.health > fighter_2.health:
-                    score[0] += 1
-                elif fighter_2.health > fighter_1.health:
-                    score[1] += 1
-                else:
-                    print("tie")
-                    # no winner
-                round_over = True
-                round_over_time = pygame.time.get_ticks()
-
-        else:
-            # display victory image
-            game_surface.blit(victory_img, (360, 150))
-            if pygame.time.get_ticks() - round_over_time > ROUND_OVER_COOLDOWN:
-                round_over = False
-                intro_count = 3
-                timer = 99
-                fighter_1 = LLMFighter(
-                    1,
-                    200,
-                    310,
-                    False,
-                    WARRIOR_DATA,
-                    warrior_sheet,
-                    WARRIOR_ANIMATION_STEPS,
-                    model_1,
-                    system_prompt_1,
-                    llm,
-                )
-
-                fighter_2 = LLMFighter(
-                    2,
-                    700,
-                    310,
-                    True,
-                    WIZARD_DATA,
-                    wizard_sheet,
-                    WIZARD_ANIMATION_STEPS,
+        match = Match(make_fighters, fps=None)
+    else:
+        from renderer import Renderer
+
+        renderer = Renderer(show_metrics=args.show_metrics)
+        if args.human:
+            make_fighters = fighter_pair(
+                lambda clock: KeyboardController(),
+                lambda clock: LLMController(
                     model_2,
                     system_prompt_2,
                     llm,
-                )
-
-        # event handler
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                run = False
-
-        # count down timer for every 1 second of real time
-        if (pygame.time.get_ticks() - last_count_update) >= 1000:
-            timer -= 1
-            last_count_update = pygame.time.get_ticks()
+                    clock,
+                    adaptive_cooldown=not args.deterministic,
+                    anticipate=args.anticipate,
+                ),
+                renderer.warrior_sheet,
+                renderer.wizard_sheet,
+            )
+        else:
+            make_fighters = llm_fighters(
+                model_1,
+                system_prompt_1,
+                model_2,
+                system_prompt_2,
+                llm,
+                renderer.warrior_sheet,
+                renderer.wizard_sheet,
+                adaptive_cooldown=not args.deterministic,
+                anticipate=args.anticipate,
+            )
+        match = Match(make_fighters, observers=[renderer])
 
-        # draw game surface onto screen and add borders
-        screen.fill((0, 0, 0))
-        screen.blit(game_surface, (BORDER_LEFT, BORDER_TOP))
-        draw_actions(screen, fighter_1, 10)
-        draw_actions(screen, fighter_2, SCREEN_WIDTH - BORDER_RIGHT + 10)
+    recorder = None
+    if args.record:
+        recorder = ReplayRecorder(args.record)
+        match.add_observer(recorder)
 
-        # update display
-        pygame.display.update()
-        await asyncio.sleep(0)
+    # game loop
+    score = await match.run(rounds=args.rounds)
+    if recorder is not None:
+        recorder.close()
+    print(f"final score: P1 {score[0]} - P2 {score[1]}")
+    if not backend.streaming and llm.cache is not None:
+        print(f"decision cache: {llm.cache.stats()}")
+    backend.close()
+    metrics.write_summary(tick=match.clock.tick)
+    metrics.close()
 
     # exit pygame
     pygame.quit()
 
 
 # This is the program entry point:
-print("start game")
-asyncio.run(main())
+if __name__ == "__main__":
+    print("start game")
+    asyncio.run(main())
@@ -0,0 +1,120 @@
+import json
+import math
+import time
+from collections import deque
+
+# samples each histogram keeps
+WINDOW = 600
+
+
+def percentile(ordered, fraction):
+    # nearest-rank percentile of sorted samples
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class Histogram:
+    """
+    Rolling window of the last `size` samples, with running totals over
+    every sample ever added.
+    """
+
+    def __init__(self, size=WINDOW):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def percentile(self, fraction):
+        if not self.samples:
+            return 0.0
+        return percentile(sorted(self.samples), fraction)
+
+    def summary(self):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {"count": self.count}
+        return {
+            "count": self.count,
+            "mean": sum(ordered) / len(ordered),
+            "p50": percentile(ordered, 0.5),
+            "p95": percentile(ordered, 0.95),
+            "p99": percentile(ordered, 0.99),
+            "max": ordered[-1],
+        }
+
+
+class Metrics:
+    """
+    Named rolling histograms and counters.
+
+    Timings are in milliseconds. Recording a sample is an append, so it is
+    cheap enough for every frame; summaries are only worked out when the
+    overlay or the export asks for them. With `export()` set up, events and
+    summaries are written to a JSON-lines file instead of stdout.
+    """
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self.histograms = {}
+        self.counters = {}
+        self.export_file = None
+
+    def observe(self, name, value):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(self.window)
+        histogram.add(value)
+
+    def since(self, name, start):
+        """
+        Record the milliseconds since a `time.perf_counter()` start, and
+        return the current time to start the next phase from
+        """
+        now = time.perf_counter()
+        self.observe(name, (now - start) * 1000)
+        return now
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def get(self, name):
+        return self.histograms.get(name) or Histogram(0)
+
+    def summary(self):
+        return {
+            "histograms": {
+                name: histogram.summary()
+                for name, histogram in sorted(self.histograms.items())
+            },
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+    def export(self, path):
+        self.close()
+        self.export_file = open(path, "a")
+
+    def write(self, kind, **fields):
+        if self.export_file is not None:
+            record = {"type": kind, "time": time.time(), **fields}
+            self.export_file.write(json.dumps(record) + "\n")
+
+    def write_summary(self, **fields):
+        if self.export_file is not None:
+            self.write("summary", **fields, **self.summary())
+
+    def clear(self):
+        self.histograms.clear()
+        self.counters.clear()
+
+    def close(self):
+        if self.export_file is not None:
+            self.export_file.close()
+            self.export_file = None
+
+
+# shared by the match, the fighters, the scheduler and the renderer
+metrics = Metrics()
@@ -0,0 +1,311 @@
+import time
+
+import pygame
+
+from engine import GAME_HEIGHT, GAME_WIDTH
+from metrics import metrics
+from text_cache import TextCache
+
+BORDER_LEFT = 200
+BORDER_RIGHT = 200
+BORDER_TOP = 50
+BORDER_BOTTOM = 150
+SCREEN_WIDTH = GAME_WIDTH + BORDER_LEFT + BORDER_RIGHT
+SCREEN_HEIGHT = GAME_HEIGHT + BORDER_TOP + BORDER_BOTTOM
+
+# define colours
+RED = (255, 0, 0)
+YELLOW = (255, 255, 0)
+WHITE = (255, 255, 255)
+
+# histograms shown on the metrics overlay, and frames between its refreshes
+OVERLAY_HISTOGRAMS = [
+    "frame.step",
+    "frame.move",
+    "frame.update",
+    "frame.draw",
+    "frame.hud",
+    "frame.display",
+    "llm.queue_wait",
+    "llm.generate",
+    "llm.latency",
+    "queue.depth",
+]
+OVERLAY_REFRESH = 30
+
+
+class Renderer:
+    """
+    Match observer that draws every step to a pygame window.
+
+    Only the regions drawn this frame or the last one are restored from the
+    cached background and sent to the display, instead of redrawing and
+    flipping the whole screen. When the window has been covered or restored
+    the whole screen is redrawn and sent once, since the window system may
+    have lost what the regions left alone. F3 toggles an overlay of the
+    metrics in the bottom border.
+    """
+
+    def __init__(self, show_metrics=False):
+        # create game window
+        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        pygame.display.set_caption("Model Brawl League")
+        # the game area is drawn straight onto the screen, clipped to its borders
+        self.game_rect = pygame.Rect(BORDER_LEFT, BORDER_TOP, GAME_WIDTH, GAME_HEIGHT)
+        self.game_surface = self.screen.subsurface(self.game_rect)
+
+        # load background image, scaled once and converted to the display format
+        bg_image = pygame.image.load("assets/images/background/background.jpg")
+        self.bg_image = pygame.transform.scale(
+            bg_image, (GAME_WIDTH, GAME_HEIGHT)
+        ).convert()
+        # what every untouched screen pixel looks like: borders and background
+        self.screen_bg = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)).convert()
+        self.screen_bg.fill((0, 0, 0))
+        self.screen_bg.blit(self.bg_image, self.game_rect)
+        self.screen.blit(self.screen_bg, (0, 0))
+        pygame.display.update()
+        self.dirty_rects = []  # screen regions drawn on the last frame
+        self.full_redraw = False  # the window needs every pixel sent again
+
+        # load spritesheets
+        self.warrior_sheet = pygame.image.load(
+            "assets/images/warrior/Sprites/warrior.png"
+        ).convert_alpha()
+        self.wizard_sheet = pygame.image.load(
+            "assets/images/wizard/Sprites/wizard.png"
+        ).convert_alpha()
+
+        # load vicory image
+        self.victory_img = pygame.image.load(
+            "assets/images/icons/victory.png"
+        ).convert_alpha()
+
+        # define font
+        self.count_font = pygame.font.Font("assets/fonts/turok.ttf", 80)
+        self.score_font = pygame.font.Font("assets/fonts/turok.ttf", 30)
+        self.action_font = pygame.font.Font("assets/fonts/turok.ttf", 20)
+        self.text_cache = TextCache()
+
+        self.show_metrics = show_metrics
+        self.metrics_lines = []
+        self.frames = 0
+
+    def mark(self, surface, rect):
+        # record a region drawn on a surface in screen coordinates
+        x, y = surface.get_abs_offset()
+        self.dirty_rects.append(rect.move(x, y))
+
+    # function for drawing text
+    def draw_text(self, surface, text, font, text_col, x, y):
+        img = self.text_cache.render(font, text, text_col)
+        self.mark(surface, surface.blit(img, (x, y)))
+
+    # function for drawing background
+    def draw_bg(self):
+        if self.full_redraw:
+            self.screen.blit(self.screen_bg, (0, 0))
+            return
+        # restore what was drawn over on the last frame
+        for rect in self.dirty_rects:
+            self.screen.blit(self.screen_bg, rect, rect)
+
+    # function for drawing fighter health bars
+    def draw_health_bar(self, surface, health, x, y):
+        ratio = health / 100
+        self.mark(surface, pygame.draw.rect(surface, WHITE, (x - 2, y - 2, 404, 34)))
+        pygame.draw.rect(surface, RED, (x, y, 400, 30))
+        pygame.draw.rect(surface, YELLOW, (x, y, 400 * ratio, 30))
+
+    def draw_timer(self, surface, timer, x, y):
+
+        if timer <= 0:
+            timer = 0
+
+        self.draw_text(surface, f"{timer}", self.count_font, RED, x, y)
+
+    def draw_actions(self, surface, fighter, x):
+        self.draw_text(surface, "Moves:", self.action_font, WHITE, x, BORDER_TOP)
+        upcoming = fighter.upcoming_actions(5)
+        if upcoming:
+            for i, action in enumerate(upcoming):
+                self.draw_text(
+                    surface,
+                    f"- {action}",
+                    self.action_font,
+                    WHITE,
+                    x,
+                    BORDER_TOP + 25 + i * 20,
+                )
+        else:
+            colour = WHITE
+            if fighter.model_ready:
+                text = "No actions"
+            elif fighter.model_error is not None:
+                text = "Model failed to load"
+                colour = RED
+            else:
+                text = "Loading model..."
+            self.draw_text(surface, text, self.action_font, colour, x, BORDER_TOP + 25)
+
+    def draw_metrics(self, surface):
+        # the numbers are only worked out every few frames, so they stay
+        # readable and the text cache isn't flooded
+        if self.frames % OVERLAY_REFRESH == 0:
+            self.metrics_lines = []
+            for name in OVERLAY_HISTOGRAMS:
+                histogram = metrics.get(name)
+                self.metrics_lines.append(
+                    f"{name}: p50 {histogram.percentile(0.5):.1f} "
+                    f"p99 {histogram.percentile(0.99):.1f}"
+                )
+            counters = metrics.counters
+            self.metrics_lines.append(
+                f"dropped {counters.get('frames.dropped', 0)}  "
+                f"parsed {counters.get('moves.parsed', 0)}  "
+                f"invalid {counters.get('moves.invalid', 0)}"
+            )
+
+        # two columns of lines under the game area
+        rows = (len(self.metrics_lines) + 1) // 2
+        for i, line in enumerate(self.metrics_lines):
+            x = BORDER_LEFT + (i // rows) * GAME_WIDTH // 2
+            y = BORDER_TOP + GAME_HEIGHT + 10 + (i % rows) * 22
+            self.draw_text(surface, line, self.action_font, WHITE, x, y)
+
+    def handle_event(self, match, event):
+        if event.type == pygame.QUIT:
+            match.stop()
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+            self.show_metrics = not self.show_metrics
+        elif event.type in (pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE):
+            self.full_redraw = True
+
+    def on_step(self, match):
+        # event handler
+        for event in pygame.event.get():
+            self.handle_event(match, event)
+
+        game_surface = self.game_surface
+        fighter_1 = match.fighter_1
+        fighter_2 = match.fighter_2
+        self.frames += 1
+
+        # draw background
+        start = time.perf_counter()
+        self.draw_bg()
+        previous_rects = self.dirty_rects
+        self.dirty_rects = []
+        hud_start = time.perf_counter()
+
+        # show player stats
+        self.draw_health_bar(game_surface, fighter_1.health, 20, 20)
+        self.draw_health_bar(game_surface, fighter_2.health, 580, 20)
+        self.draw_text(
+            game_surface,
+            f"P1: {fighter_1.name} " + str(match.score[0]),
+            self.score_font,
+            RED,
+            20,
+            60,
+        )
+        self.draw_text(
+            game_surface,
+            f"P2: {fighter_2.name} " + str(match.score[1]),
+            self.score_font,
+            RED,
+            580,
+            60,
+        )
+        self.draw_timer(game_surface, match.timer, 460, 10)
+
+        # display count timer
+        if match.intro_count > 0:
+            self.draw_text(
+                game_surface,
+                str(match.intro_count),
+                self.count_font,
+                RED,
+                GAME_WIDTH / 2,
+                GAME_HEIGHT / 3,
+            )
+
+        # draw fighters
+        fighters_start = time.perf_counter()
+        self.mark(game_surface, fighter_1.draw(game_surface))
+        self.mark(game_surface, fighter_2.draw(game_surface))
+
+        # display victory image
+        if match.round_over:
+            self.mark(game_surface, game_surface.blit(self.victory_img, (360, 150)))
+
+        # draw the move lists in the borders
+        actions_start = time.perf_counter()
+        self.draw_actions(self.screen, fighter_1, 10)
+        self.draw_actions(self.screen, fighter_2, SCREEN_WIDTH - BORDER_RIGHT + 10)
+        if self.show_metrics:
+            self.draw_metrics(self.screen)
+
+        # update only the regions that changed
+        display_start = time.perf_counter()
+        if self.full_redraw:
+            pygame.display.update()
+            self.full_redraw = False
+        else:
+            pygame.display.update(previous_rects + self.dirty_rects)
+
+        # background and fighters count as drawing, text and bars as HUD
+        metrics.observe(
+            "frame.draw",
+            (hud_start - start + actions_start - fighters_start) * 1000,
+        )
+        metrics.observe(
+            "frame.hud",
+            (fighters_start - hud_start + display_start - actions_start) * 1000,
+        )
+        metrics.since("frame.display", display_start)
+
+
+class Spectator(Renderer):
+    """
+    Arena view that draws only the match being watched. Tab or the right
+    arrow moves to the next unfinished match, the left arrow to the one
+    before, and closing the window stops the arena.
+    """
+
+    def __init__(self, show_metrics=False):
+        super().__init__(show_metrics=show_metrics)
+        self.arena = None
+        self.watched = 0
+
+    def watch(self, step):
+        count = len(self.arena.matches)
+        for _ in range(count):
+            self.watched = (self.watched + step) % count
+            if self.arena.active(self.watched):
+                break
+        pygame.display.set_caption(
+            f"Model Brawl League - match {self.watched + 1} of {count}"
+        )
+
+    def handle_event(self, match, event):
+        if event.type == pygame.QUIT:
+            self.arena.stop()
+        elif event.type == pygame.KEYDOWN and event.key in (
+            pygame.K_TAB,
+            pygame.K_RIGHT,
+        ):
+            self.watch(1)
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_LEFT:
+            self.watch(-1)
+        else:
+            super().handle_event(match, event)
+
+    def on_frame(self, arena):
+        if self.arena is None:
+            self.arena = arena
+            self.watch(0)
+        # a finished match stays on screen until there is another to watch
+        if not arena.active(self.watched):
+            self.watch(1)
+        self.on_step(arena.matches[self.watched])
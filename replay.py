@@ -0,0 +1,317 @@
+import bisect
+import json
+import mmap
+import struct
+
+import pygame
+
+from sim_clock import SimClock
+from sprites import load_animations
+
+MAGIC = b"MBLR"
+VERSION = 1
+# magic, version, header length
+PREAMBLE = struct.Struct("<4sHI")
+# one struct code per field:
+# tick, timer, intro count, round over, P1 score, P2 score
+MATCH_RECORD = "IhbBHH"
+# x, y, health, animation action, frame index shown, flip
+FIGHTER_RECORD = "hhhbB?"
+TICK_RECORD = struct.Struct("<" + MATCH_RECORD + FIGHTER_RECORD * 2)
+
+
+def plans_path(path):
+    return path + ".plans.jsonl"
+
+
+class ReplayRecorder:
+    """
+    Match observer that appends one fixed-size record per tick to a file.
+
+    A record holds the match clock, timer, countdown and score, and each
+    fighter's position, health, animation frame and facing. The plans that
+    reach the fighters and the round results go to a JSON-lines file next
+    to it. Records are packed with `struct` and left to the file's buffer,
+    so recording costs a few microseconds a tick, and because every record
+    has the same size a reader can memory-map the file and seek straight to
+    any tick.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.plans_file = None
+        self.results = 0
+
+    def start(self, match):
+        players = []
+        for fighter in (match.fighter_1, match.fighter_2):
+            players.append(
+                {
+                    "player": fighter.player,
+                    "model": fighter.name,
+                    "data": [fighter.size, fighter.image_scale, fighter.offset],
+                    "animation_steps": list(fighter.animation_steps),
+                    "rect_size": [fighter.rect.width, fighter.rect.height],
+                }
+            )
+        header = json.dumps(
+            {
+                "fps": match.clock.fps,
+                "first_tick": match.clock.tick,
+                "record": TICK_RECORD.format,
+                "players": players,
+            }
+        ).encode()
+        # pad so the records start on an 8 byte boundary
+        header += b" " * (-(PREAMBLE.size + len(header)) % 8)
+
+        self.file = open(self.path, "wb")
+        self.file.write(PREAMBLE.pack(MAGIC, VERSION, len(header)))
+        self.file.write(header)
+        self.plans_file = open(plans_path(self.path), "w")
+
+    def on_step(self, match):
+        if self.file is None:
+            self.start(match)
+        fighter_1 = match.fighter_1
+        fighter_2 = match.fighter_2
+        self.file.write(
+            TICK_RECORD.pack(
+                match.clock.tick,
+                match.timer,
+                match.intro_count,
+                match.round_over,
+                match.score[0],
+                match.score[1],
+                fighter_1.rect.x,
+                fighter_1.rect.y,
+                fighter_1.health,
+                fighter_1.action,
+                fighter_1.shown_frame,
+                fighter_1.flip,
+                fighter_2.rect.x,
+                fighter_2.rect.y,
+                fighter_2.health,
+                fighter_2.action,
+                fighter_2.shown_frame,
+                fighter_2.flip,
+            )
+        )
+        while self.results < len(match.results):
+            self.write_event(
+                {
+                    "type": "round",
+                    "tick": match.clock.tick,
+                    "winner": match.results[self.results],
+                }
+            )
+            self.results += 1
+
+    def on_plan(self, match, fighter, request_tick, moves):
+        self.write_event(
+            {
+                "type": "plan",
+                "tick": match.clock.tick,
+                "player": fighter.player,
+                "request_tick": request_tick,
+                "moves": moves,
+            }
+        )
+
+    def write_event(self, event):
+        if self.plans_file is not None:
+            self.plans_file.write(json.dumps(event) + "\n")
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.plans_file.close()
+            self.file = None
+            self.plans_file = None
+
+
+class ReplayReader:
+    """
+    Memory-mapped view of a recorded match. `reader[i]` unpacks the i-th
+    recorded tick, and `index(tick)` finds the record for a game tick.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_length = PREAMBLE.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} replay")
+        self.header = json.loads(
+            self.map[PREAMBLE.size : PREAMBLE.size + header_length]
+        )
+        self.offset = PREAMBLE.size + header_length
+        # a record cut short by a crash is ignored
+        self.length = (len(self.map) - self.offset) // TICK_RECORD.size
+        if self.length == 0:
+            self.close()
+            raise ValueError(f"{path} has no ticks")
+        self.first_tick = self.header["first_tick"]
+
+        # (tick, moves, request tick) of each player's plans in arrival order
+        self.plans = {player["player"]: [] for player in self.header["players"]}
+        self.results = []
+        try:
+            with open(plans_path(path)) as f:
+                for line in f:
+                    event = json.loads(line)
+                    if event["type"] == "plan":
+                        self.plans[event["player"]].append(
+                            (event["tick"], event["moves"], event["request_tick"])
+                        )
+                    elif event["type"] == "round":
+                        self.results.append(event["winner"])
+        except FileNotFoundError:
+            pass
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.length:
+            raise IndexError(i)
+        return TICK_RECORD.unpack_from(self.map, self.offset + i * TICK_RECORD.size)
+
+    def index(self, tick):
+        return min(max(tick - self.first_tick, 0), self.length - 1)
+
+    def plan_at(self, player, tick):
+        """
+        Return the last plan a player received at or before a tick
+        """
+        plans = self.plans[player]
+        i = bisect.bisect_right(plans, tick, key=lambda plan: plan[0])
+        return plans[i - 1][1] if i else []
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+class ReplayFighter:
+    """
+    What the Renderer needs of a fighter, filled in from a tick record
+    """
+
+    def __init__(self, info, sprite_sheet):
+        self.player = info["player"]
+        self.name = info["model"]
+        self.size, self.image_scale, self.offset = info["data"]
+        self.animation_list, self.flipped_list = load_animations(
+            sprite_sheet, self.size, self.image_scale, info["animation_steps"]
+        )
+        self.rect = pygame.Rect(0, 0, *info["rect_size"])
+        self.health = 0
+        self.action = 0
+        self.frame_index = 0
+        self.flip = False
+        self.plan = []
+        self.model_ready = True
+        self.model_error = None
+
+    def load(self, x, y, health, action, frame_index, flip, plan):
+        self.rect.x = x
+        self.rect.y = y
+        self.health = health
+        self.action = action
+        self.frame_index = frame_index
+        self.flip = flip
+        self.plan = plan
+
+    def upcoming_actions(self, count):
+        return self.plan[:count]
+
+    def draw(self, surface):
+        frames = self.flipped_list if self.flip else self.animation_list
+        return surface.blit(
+            frames[self.action][self.frame_index],
+            (
+                self.rect.x - (self.offset[0] * self.image_scale),
+                self.rect.y - (self.offset[1] * self.image_scale),
+            ),
+        )
+
+
+class ReplayMatch:
+    """
+    Plays a recording back through the match observers, without fighters
+    or a model.
+
+    `speed` is recorded ticks per shown frame and may be fractional or
+    negative, and `seek(tick)` jumps anywhere in the recording. Player 1 is
+    drawn from the warrior sheet and player 2 from the wizard sheet, as in
+    `fighter_pair`.
+    """
+
+    def __init__(self, reader, warrior_sheet, wizard_sheet, observers=None, speed=1):
+        self.reader = reader
+        self.observers = list(observers or [])
+        self.speed = speed
+        self.clock = SimClock(reader.header["fps"])
+        self.frame_clock = pygame.time.Clock()
+        self.running = True
+        players = reader.header["players"]
+        self.fighter_1 = ReplayFighter(players[0], warrior_sheet)
+        self.fighter_2 = ReplayFighter(players[1], wizard_sheet)
+        self.position = 0.0
+        self.seek(reader.first_tick)
+
+    def add_observer(self, observer):
+        self.observers.append(observer)
+
+    def stop(self):
+        self.running = False
+
+    def seek(self, tick):
+        self.position = float(self.reader.index(tick))
+        self.load(int(self.position))
+
+    def load(self, i):
+        record = self.reader[i]
+        (
+            tick,
+            self.timer,
+            self.intro_count,
+            round_over,
+            score_1,
+            score_2,
+        ) = record[: len(MATCH_RECORD)]
+        self.clock.tick = tick
+        self.round_over = bool(round_over)
+        self.score = [score_1, score_2]
+        fields = len(FIGHTER_RECORD)
+        for n, fighter in enumerate((self.fighter_1, self.fighter_2)):
+            start = len(MATCH_RECORD) + n * fields
+            fighter.load(
+                *record[start : start + fields],
+                self.reader.plan_at(fighter.player, tick),
+            )
+
+    def step(self):
+        self.load(int(self.position))
+        for observer in self.observers:
+            observer.on_step(self)
+        # stop after showing the last record in the direction of play, so a
+        # fast replay still ends on the final score
+        end = len(self.reader) - 1
+        if (self.speed > 0 and self.position >= end) or (
+            self.speed < 0 and self.position <= 0
+        ):
+            self.stop()
+        self.position = min(max(self.position + self.speed, 0), end)
+
+    def run(self):
+        """
+        Play the recording until it ends or the window is closed, and return
+        the final score
+        """
+        while self.running:
+            self.frame_clock.tick(self.clock.fps)
+            self.step()
+        return self.score
@@ -0,0 +1,404 @@
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import random
+
+import numpy as np
+
+from backends import HTTPBackend, MockBackend
+from engine import Match, llm_fighters
+from fighter import MAX_HEALTH
+from inference import (
+    PRECISIONS,
+    SAMPLING_TEMPERATURE,
+    InferenceScheduler,
+    load_backend,
+)
+from llm_fighter import VALID_ACTIONS
+
+MODEL_NAME = "bigscience/bloom-560m"
+ROUNDS_PER_MATCH = 3
+# matches played at once, sharing one inference scheduler
+CONCURRENCY = 16
+SAMPLES_PER_SHARD = 100_000
+# game time after a request over which its health delta is measured
+REWARD_HORIZON = 2000
+MANIFEST = "manifest.json"
+# digests held in a set before they are merged into the sorted array
+DIGEST_BATCH = 65536
+
+# each fighter of a match plays one of these, drawn from the match's seed
+SYSTEM_PROMPTS = [
+    "You are a very defensive player",
+    "You are a very aggressive player",
+    "You are a patient player who waits for the opponent to come close",
+    "You are an acrobatic player who likes to jump",
+    "You are a player who prefers low attacks",
+    "You are a player who prefers high attacks",
+]
+
+
+def digest(text):
+    # 8 bytes is plenty to tell millions of prompts apart
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "big")
+
+
+class DigestSet:
+    """
+    Set of 64-bit digests in 8 bytes each.
+
+    New digests go into a small set, which is merged into a sorted uint64
+    array once it holds `batch` of them, and lookups binary search the
+    array. Ten million samples take 80 MB, where a set of Python ints would
+    take close to a gigabyte.
+    """
+
+    def __init__(self, batch=DIGEST_BATCH):
+        self.batch = batch
+        self.sorted = np.empty(0, dtype=np.uint64)
+        self.recent = set()
+
+    def __len__(self):
+        return len(self.sorted) + len(self.recent)
+
+    def __contains__(self, key):
+        if key in self.recent:
+            return True
+        i = np.searchsorted(self.sorted, np.uint64(key))
+        return i < len(self.sorted) and self.sorted[i] == key
+
+    def add(self, key):
+        self.recent.add(key)
+        if len(self.recent) >= self.batch:
+            recent = np.fromiter(self.recent, dtype=np.uint64, count=len(self.recent))
+            self.sorted = np.union1d(self.sorted, recent)
+            self.recent.clear()
+
+
+class DatasetWriter:
+    """
+    Writes samples to gzip JSON-lines shards in a directory.
+
+    A shard is written to a temporary file and renamed once it holds
+    `shard_size` samples, and the manifest then lists it with the matches
+    it finished. Shards only roll over between matches, so every match in
+    the manifest is complete, and a resumed run replays just the matches
+    that aren't. `dedup` drops samples whose prompt ("prompt"), or prompt
+    and completion ("sample"), were already written, remembered by their
+    digests. A last shard left with only duplicates isn't written, and the
+    manifest lists its matches under "empty_matches" instead.
+    """
+
+    def __init__(self, directory, shard_size=SAMPLES_PER_SHARD, dedup="sample"):
+        self.directory = directory
+        self.shard_size = shard_size
+        self.dedup = dedup
+        self.seen = DigestSet()
+        self.shards = []  # manifest entries of finished shards
+        self.empty_matches = []  # finished matches whose samples were duplicates
+        self.done = set()  # matches in finished shards
+        self.file = None
+        self.shard_samples = 0
+        self.shard_matches = []
+        self.samples = 0
+        self.duplicates = 0
+
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(os.path.join(directory, MANIFEST)) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = {"shards": []}
+        self.empty_matches = manifest.get("empty_matches", [])
+        self.done.update(self.empty_matches)
+        for shard in manifest["shards"]:
+            self.shards.append(shard)
+            self.done.update(shard["matches"])
+            self.samples += shard["samples"]
+            if self.dedup != "none":
+                with gzip.open(os.path.join(directory, shard["name"]), "rt") as f:
+                    for line in f:
+                        self.seen.add(self.key(json.loads(line)))
+        # a shard that was never finished belongs to matches that get replayed
+        for name in os.listdir(directory):
+            if name.endswith(".tmp"):
+                os.remove(os.path.join(directory, name))
+
+    def key(self, sample):
+        if self.dedup == "prompt":
+            return digest(sample["prompt"])
+        return digest(sample["prompt"] + "\0" + sample["completion"])
+
+    def shard_name(self):
+        return f"shard-{len(self.shards):05d}.jsonl.gz"
+
+    def write_match(self, match_id, samples):
+        if self.file is None:
+            path = os.path.join(self.directory, self.shard_name() + ".tmp")
+            self.file = gzip.open(path, "wt", compresslevel=6)
+        for sample in samples:
+            if self.dedup != "none":
+                key = self.key(sample)
+                if key in self.seen:
+                    self.duplicates += 1
+                    continue
+                self.seen.add(key)
+            self.file.write(json.dumps(sample) + "\n")
+            self.shard_samples += 1
+            self.samples += 1
+        self.shard_matches.append(match_id)
+        if self.shard_samples >= self.shard_size:
+            self.finish_shard()
+
+    def finish_shard(self):
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        name = self.shard_name()
+        path = os.path.join(self.directory, name)
+        if self.shard_samples:
+            os.replace(path + ".tmp", path)
+            self.shards.append(
+                {
+                    "name": name,
+                    "samples": self.shard_samples,
+                    "matches": sorted(self.shard_matches),
+                }
+            )
+        else:
+            os.remove(path + ".tmp")
+            self.empty_matches = sorted(self.empty_matches + self.shard_matches)
+        self.done.update(self.shard_matches)
+        self.shard_samples = 0
+        self.shard_matches = []
+
+        manifest = {"shards": self.shards}
+        if self.empty_matches:
+            manifest["empty_matches"] = self.empty_matches
+        path = os.path.join(self.directory, MANIFEST)
+        with open(path + ".tmp", "w") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(path + ".tmp", path)
+
+    def close(self):
+        self.finish_shard()
+
+
+class SampleRecorder:
+    """
+    Match observer that turns each model answer into a training sample.
+
+    A sample holds the game state and prompt at the request, the model's
+    completion and parsed moves, the change in the health difference over
+    the next `REWARD_HORIZON` ms of game time, and the outcome of the
+    round: 1 for a win, -1 for a loss and 0 for a tie. Samples wait until
+    their round ends, and the match's samples are handed to the writer
+    together when it finishes.
+    """
+
+    def __init__(self, match_id, horizon=REWARD_HORIZON):
+        self.match_id = match_id
+        self.horizon = horizon
+        self.fighters = None
+        self.round_start = 0
+        self.history = []  # (timer, x 1, x 2, health 1, health 2) per tick
+        self.pending = []
+        self.samples = []
+        self.results = 0
+
+    def on_step(self, match):
+        fighter_1 = match.fighter_1
+        fighter_2 = match.fighter_2
+        if self.fighters != (fighter_1, fighter_2):
+            # new fighters mean a new round
+            self.fighters = (fighter_1, fighter_2)
+            self.round_start = match.clock.tick
+            self.history = []
+            self.pending = []
+        if len(match.results) > self.results:
+            self.finish_round(match, match.results[-1])
+            self.results = len(match.results)
+        if not match.round_over:
+            self.history.append(
+                (
+                    match.timer,
+                    fighter_1.rect.x,
+                    fighter_2.rect.x,
+                    fighter_1.health,
+                    fighter_2.health,
+                )
+            )
+
+    def on_response(self, match, fighter, request_tick, prompt, text, moves):
+        # the prompt was built from the state at the end of the tick before
+        # the request, and answers that land after their round are dropped
+        i = request_tick - self.round_start - 1
+        if match.round_over or not 0 <= i < len(self.history):
+            return
+        timer, x_1, x_2, health_1, health_2 = self.history[i]
+        if fighter.player == 2:
+            x_1, x_2, health_1, health_2 = x_2, x_1, health_2, health_1
+        self.pending.append(
+            {
+                "match": self.match_id,
+                "round": len(match.results),
+                "player": fighter.player,
+                "model": fighter.name,
+                "tick": request_tick,
+                "state": {
+                    "timer": timer,
+                    "x": x_1,
+                    "opponent_x": x_2,
+                    "health": health_1,
+                    "opponent_health": health_2,
+                },
+                "prompt": prompt,
+                "completion": text,
+                "moves": moves,
+            }
+        )
+
+    def finish_round(self, match, winner):
+        horizon = match.clock.ticks(self.horizon)
+        for sample in self.pending:
+            i = sample["tick"] - self.round_start - 1 + horizon
+            _, _, _, health_1, health_2 = self.history[min(i, len(self.history) - 1)]
+            if sample["player"] == 2:
+                health_1, health_2 = health_2, health_1
+            state = sample["state"]
+            lead = state["health"] - state["opponent_health"]
+            delta = (health_1 - health_2) - lead
+            outcome = 0 if winner == 0 else (1 if winner == sample["player"] else -1)
+            sample["health_delta"] = delta
+            sample["outcome"] = outcome
+            sample["reward"] = delta / MAX_HEALTH + outcome
+        self.samples.extend(self.pending)
+        self.pending = []
+
+
+async def play(match_id, llm, rounds, seed, writer):
+    # the fighters' personas come from the match's own seed, and the model
+    # samples, so no two matches play out alike
+    rng = random.Random(f"{seed}:{match_id}")
+    recorder = SampleRecorder(match_id)
+    # a fixed model cadence keeps matches alike however busy the model is
+    make_fighters = llm_fighters(
+        MODEL_NAME,
+        rng.choice(SYSTEM_PROMPTS),
+        MODEL_NAME,
+        rng.choice(SYSTEM_PROMPTS),
+        llm,
+        adaptive_cooldown=False,
+    )
+    match = Match(make_fighters, fps=None, observers=[recorder])
+    await match.run(rounds=rounds)
+    writer.write_match(match_id, recorder.samples)
+
+
+async def generate(llm, writer, matches, rounds, seed, concurrency=CONCURRENCY):
+    """
+    Play every match not already in the dataset, `concurrency` at a time
+    """
+    todo = iter([i for i in range(matches) if i not in writer.done])
+
+    async def worker():
+        for match_id in todo:
+            await play(match_id, llm, rounds, seed, writer)
+            print(
+                f"match {match_id}: {writer.samples} samples, "
+                f"{writer.duplicates} duplicates"
+            )
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Model Brawl League self-play data")
+    parser.add_argument("output", help="directory for the dataset shards")
+    parser.add_argument("--matches", type=int, default=100, help="matches to play")
+    parser.add_argument(
+        "--rounds", type=int, default=ROUNDS_PER_MATCH, help="rounds per match"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=CONCURRENCY, help="matches played at once"
+    )
+    parser.add_argument(
+        "--shard-size",
+        type=int,
+        default=SAMPLES_PER_SHARD,
+        help="samples per shard file",
+    )
+    parser.add_argument(
+        "--dedup",
+        choices=["sample", "prompt", "none"],
+        default="sample",
+        help="drop repeated prompt and completion pairs, or repeated prompts",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--temperature",
+        type=float,
+        default=SAMPLING_TEMPERATURE,
+        help="model sampling temperature; 0 decodes greedily, and then "
+        "matches with the same personas play out the same",
+    )
+    parser.add_argument(
+        "--backend", choices=["transformers", "http", "mock"], default="transformers"
+    )
+    parser.add_argument("--server-url", default="http://127.0.0.1:8080")
+    parser.add_argument("--server-api", choices=["openai", "tgi"], default="openai")
+    parser.add_argument("--prefix-cache", action="store_true")
+    parser.add_argument("--precision", choices=PRECISIONS, default="fp32")
+    parser.add_argument("--threads", type=int, default=None)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.backend == "http":
+        backend = HTTPBackend(
+            args.server_url,
+            model=MODEL_NAME,
+            api=args.server_api,
+            temperature=args.temperature,
+        )
+    elif args.backend == "mock":
+        backend = MockBackend(
+            VALID_ACTIONS, seed=args.seed, temperature=args.temperature
+        )
+    else:
+        backend = load_backend(
+            MODEL_NAME,
+            prefix_cache=args.prefix_cache,
+            precision=args.precision,
+            threads=args.threads,
+            temperature=args.temperature,
+        )
+        from transformers import set_seed
+
+        set_seed(args.seed)
+
+    writer = DatasetWriter(args.output, args.shard_size, args.dedup)
+    if writer.done:
+        print(f"resuming: {len(writer.done)} matches already written")
+    # every match's prompts are batched together
+    llm = InferenceScheduler(backend)
+    try:
+        asyncio.run(
+            generate(
+                llm, writer, args.matches, args.rounds, args.seed, args.concurrency
+            )
+        )
+    finally:
+        writer.close()
+        backend.close()
+    print(f"{writer.samples} samples in {len(writer.shards)} shards")
+
+
+# This is the program entry point:
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+FPS = 60
+
+
+class SimClock:
+    """
+    Fixed-timestep game clock.
+
+    The match advances it by exactly one tick per step, so every timing
+    decision counts ticks instead of reading wall-clock time. A match plays out
+    the same whether it runs in real time, uncapped or on an overloaded box.
+    """
+
+    def __init__(self, fps=FPS):
+        self.fps = fps
+        self.tick = 0
+
+    def advance(self):
+        self.tick += 1
+
+    def ticks(self, ms):
+        """
+        Return the number of whole ticks in a duration given in milliseconds
+        """
+        return round(ms * self.fps / 1000)
+
+    def ms(self, ticks):
+        """
+        Return the game time in milliseconds covered by a number of ticks
+        """
+        return ticks * 1000 / self.fps
@@ -0,0 +1,37 @@
+import pygame
+
+# (sprite sheet, size, scale, animation steps) -> (frames, flipped frames)
+animation_cache = {}
+
+
+def load_animations(sprite_sheet, size, scale, animation_steps):
+    """
+    Return the scaled animation frames of a sprite sheet, and the same frames
+    flipped to face left, as lists indexed by [action][frame].
+
+    The frames are built once per process and shared by every fighter and
+    round that uses the same sheet, size, scale and steps.
+    """
+    key = (sprite_sheet, size, scale, tuple(animation_steps))
+    if key not in animation_cache:
+        # extract images from spritesheet
+        animation_list = []
+        flipped_list = []
+        for y, animation in enumerate(animation_steps):
+            temp_img_list = []
+            temp_flipped_list = []
+            for x in range(animation):
+                temp_img = sprite_sheet.subsurface(x * size, y * size, size, size)
+                scaled_img = pygame.transform.scale(
+                    temp_img, (size * scale, size * scale)
+                )
+                temp_img_list.append(scaled_img)
+                temp_flipped_list.append(pygame.transform.flip(scaled_img, True, False))
+            animation_list.append(temp_img_list)
+            flipped_list.append(temp_flipped_list)
+        animation_cache[key] = (animation_list, flipped_list)
+    return animation_cache[key]
+
+
+def clear_animation_cache():
+    animation_cache.clear()
@@ -0,0 +1,45 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from action_buffer import MAX_PLAN_AGE, ActionBuffer
+from llm_fighter import PLAN_AGE_MARGIN, LLMController
+from sim_clock import SimClock
+
+
+def test_overflow_drops_the_tail():
+    buffer = ActionBuffer(SimClock(), max_depth=4)
+    buffer.replace(["JUMP", "HIGH_ATTACK", "LOW_ATTACK"])
+    buffer.extend(["MOVE_CLOSER", "MOVE_AWAY", "JUMP"])
+    # the moves about to be played are kept, the end of the new plan isn't
+    assert list(buffer) == ["JUMP", "HIGH_ATTACK", "LOW_ATTACK", "MOVE_CLOSER"]
+    assert buffer.dropped == 2
+    buffer.replace(["LOW_ATTACK"] * 6)
+    assert len(buffer) == 4
+    assert buffer.dropped == 4
+
+
+def test_stale_actions_are_evicted():
+    clock = SimClock()
+    buffer = ActionBuffer(clock, max_age=1000)
+    buffer.replace(["JUMP", "HIGH_ATTACK"])
+    for _ in range(clock.ticks(1000)):
+        clock.advance()
+    assert buffer.fresh_ticks() == 0
+    assert buffer.pop() == "JUMP"
+    clock.advance()
+    assert buffer.pop() is None
+    assert buffer.evicted == 1
+    assert len(buffer) == 0
+
+
+def test_slow_plans_raise_the_age_bound():
+    controller = LLMController("mock", "", None, SimClock())
+    assert controller.action_queue.max_age == MAX_PLAN_AGE
+    # plans stamped at their request must still be fresh when they land
+    controller.record_latency(2500)
+    assert controller.plan_delay == 2500
+    assert controller.action_queue.max_age == 2500 + PLAN_AGE_MARGIN
+    controller.record_latency(200)
+    assert controller.action_queue.max_age >= MAX_PLAN_AGE
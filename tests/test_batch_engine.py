@@ -0,0 +1,94 @@
+import asyncio
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_engine import NOOP, BatchMatch
+from controllers import Controller
+from engine import Match, fighter_pair
+from llm_fighter import VALID_ACTIONS
+
+MATCHES = 8
+TICKS = 12000
+
+
+class TableController(Controller):
+    """
+    Plays the action the table gives its player for the current tick, as
+    BatchMatch.step() does
+    """
+
+    def __init__(self, table, player):
+        super().__init__()
+        self.table = table
+        self.player = player
+
+    def next_actions(self, target):
+        code = self.table[self.fighter.clock.tick, self.player]
+        return () if code == NOOP else (VALID_ACTIONS[code],)
+
+
+def state(match):
+    fighters = (match.fighter_1, match.fighter_2)
+    return (
+        [
+            (f.rect.x, f.rect.y, f.health, f.action, f.shown_frame, f.flip)
+            for f in fighters
+        ],
+        match.score,
+        match.timer,
+        match.intro_count,
+    )
+
+
+def batch_state(batch, i):
+    fighters = [
+        (
+            int(batch.x[i, p]),
+            int(batch.y[i, p]),
+            int(batch.health[i, p]),
+            int(batch.action[i, p]),
+            int(batch.shown_frame[i, p]),
+            bool(batch.flip[i, p]),
+        )
+        for p in (0, 1)
+    ]
+    return (
+        fighters,
+        batch.score[i].tolist(),
+        int(batch.timer[i]),
+        int(batch.intro_count[i]),
+    )
+
+
+async def play(tables):
+    matches = [
+        Match(
+            fighter_pair(
+                lambda clock, table=table: TableController(table, 0),
+                lambda clock, table=table: TableController(table, 1),
+            ),
+            fps=None,
+        )
+        for table in tables
+    ]
+    batch = BatchMatch(len(tables))
+    for tick in range(TICKS):
+        for match in matches:
+            await match.step()
+        batch.step(tables[:, tick])
+        for i, match in enumerate(matches):
+            assert state(match) == batch_state(batch, i), f"match {i}, tick {tick}"
+    return matches, batch
+
+
+def test_batch_match_follows_match():
+    rng = np.random.default_rng(0)
+    tables = rng.integers(NOOP, len(VALID_ACTIONS), size=(MATCHES, TICKS, 2))
+    matches, batch = asyncio.run(play(tables))
+    # the ticks covered the end of the intro and several whole rounds
+    assert min(len(match.results) for match in matches) >= 2
+    assert batch.rounds.tolist() == [len(match.results) for match in matches]
@@ -0,0 +1,61 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import decision_cache
+from decision_cache import DecisionCache
+
+
+def test_least_recently_used_is_evicted():
+    cache = DecisionCache(max_size=2)
+    cache.store("a", "- JUMP")
+    cache.store("b", "- LOW_ATTACK")
+    assert cache.lookup("a") == "- JUMP"
+    # "b" is now the least recently used
+    cache.store("c", "- HIGH_ATTACK")
+    assert cache.lookup("b") is None
+    assert cache.lookup("a") == "- JUMP"
+    assert cache.lookup("c") == "- HIGH_ATTACK"
+    assert cache.evicted == 1
+    assert cache.stats()["size"] == 2
+
+
+def test_answers_expire(monkeypatch):
+    now = 100.0
+    monkeypatch.setattr(decision_cache.time, "monotonic", lambda: now)
+    cache = DecisionCache(ttl=5)
+    cache.store("a", "- JUMP")
+    now += 5
+    assert cache.lookup("a") == "- JUMP"
+    now += 1
+    assert cache.lookup("a") is None
+    assert cache.expired == 1
+    assert cache.stats()["size"] == 0
+
+
+def test_samples_collect_before_hits():
+    answers = ["- JUMP", "- LOW_ATTACK", "- HIGH_ATTACK"]
+
+    def picks(seed):
+        cache = DecisionCache(samples=3, seed=seed)
+        for answer in answers:
+            # a key misses until all its samples are stored
+            assert cache.lookup("a") is None
+            cache.store("a", answer)
+        return [cache.lookup("a") for _ in range(20)]
+
+    first = picks(0)
+    assert set(first) == set(answers)
+    # the same seed picks the same answers
+    assert picks(0) == first
+
+
+def test_repeated_answer_ends_collecting():
+    cache = DecisionCache(samples=3)
+    cache.store("a", "- JUMP")
+    assert cache.lookup("a") is None
+    cache.store("a", "- JUMP")
+    assert cache.lookup("a") == "- JUMP"
+    assert cache.hits == 1
+    assert cache.misses == 1
@@ -0,0 +1,47 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inference import InferenceScheduler
+
+
+def queue(scheduler, source, prompts, start):
+    for i, prompt in enumerate(prompts):
+        scheduler.pending.append((prompt, None, 50, None, start + i, source))
+
+
+def sources(batch):
+    return [request[5] for request in batch]
+
+
+def test_sources_take_turns():
+    scheduler = InferenceScheduler(None, max_batch_size=4)
+    # one fighter floods the queue before the other asks
+    queue(scheduler, "greedy", [f"g{i}" for i in range(10)], 0)
+    queue(scheduler, "patient", ["p0", "p1", "p2"], 10)
+
+    batch = scheduler.take_batch()
+    assert sorted(sources(batch)) == ["greedy", "greedy", "patient", "patient"]
+    # the batch keeps submission order
+    assert [request[0] for request in batch] == ["g0", "g1", "p0", "p1"]
+
+    batch = scheduler.take_batch()
+    assert [request[0] for request in batch] == ["g2", "g3", "g4", "p2"]
+    assert sources(scheduler.pending) == ["greedy"] * 5
+
+
+def test_requests_without_a_source_count_alone():
+    scheduler = InferenceScheduler(None, max_batch_size=3)
+    queue(scheduler, "greedy", ["g0", "g1", "g2"], 0)
+    queue(scheduler, None, ["a", "b"], 3)
+    batch = scheduler.take_batch()
+    assert [request[0] for request in batch] == ["g0", "a", "b"]
+
+
+def test_small_queue_goes_in_one_batch():
+    scheduler = InferenceScheduler(None, max_batch_size=4)
+    queue(scheduler, "greedy", ["g0", "g1", "g2"], 0)
+    queue(scheduler, "patient", ["p0"], 3)
+    assert len(scheduler.take_batch()) == 4
+    assert scheduler.pending == []
@@ -0,0 +1,118 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends import Backend
+from engine import fighter_pair
+from inference import PrefixCachedGenerator
+from llm_fighter import LLMController, MoveParser
+from metrics import metrics
+from sim_clock import SimClock
+
+
+class ChunkedBackend(Backend):
+    """
+    Streams a fixed answer in the chunks it is given
+    """
+
+    streaming = True
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def generate(self, prompts, max_new_tokens, prefixes=None):
+        return ["".join(self.chunks)] * len(prompts)
+
+    async def stream(self, prompt, max_new_tokens=50, prefix=None):
+        for chunk in self.chunks:
+            yield chunk
+
+
+def test_moves_split_across_chunks():
+    parser = MoveParser()
+    assert parser.feed("\n- HIGH_AT") == []
+    assert parser.feed("TACK\n- JU") == ["HIGH_ATTACK"]
+    assert parser.feed("MP\n") == ["JUMP"]
+    assert parser.moves == ["HIGH_ATTACK", "JUMP"]
+
+
+def test_last_line_without_newline():
+    parser = MoveParser()
+    assert parser.feed("- LOW_ATTACK\n- MOVE_CLOSER") == ["LOW_ATTACK"]
+    # a move only counts as complete at its newline or the end of the text
+    assert parser.close() == ["MOVE_CLOSER"] * 5
+    assert parser.parsed == 2
+    assert parser.valid_moves == ["LOW_ATTACK"] + ["MOVE_CLOSER"] * 5
+
+
+def test_invalid_moves_are_counted():
+    chunks = ["\n- JUMP\n- DA", "NCE\n- LOW_", "ATTACK\n- FLY"]
+    controller = LLMController(
+        "mock", "", ChunkedBackend(chunks), SimClock(), adaptive_cooldown=False
+    )
+    fighter_pair(
+        lambda clock: controller,
+        lambda clock: LLMController("mock", "", ChunkedBackend([]), clock),
+    )(controller.clock)
+    invalid = metrics.counters.get("moves.invalid", 0)
+    parsed = metrics.counters.get("moves.parsed", 0)
+    moves = asyncio.run(controller.get_llm_actions("state", 0))
+    assert moves == ["JUMP", "LOW_ATTACK"]
+    assert metrics.counters["moves.invalid"] - invalid == 2
+    assert metrics.counters["moves.parsed"] - parsed == 2
+
+
+class SlowModel:
+    """
+    Stands in for a model, and notes how many generations ran at once
+    """
+
+    def __init__(self):
+        self.running = 0
+        self.most_running = 0
+        self.guard = threading.Lock()
+
+    def generate(self, input_ids, max_new_tokens, **kwargs):
+        with self.guard:
+            self.running += 1
+            self.most_running = max(self.most_running, self.running)
+        time.sleep(0.02)
+        with self.guard:
+            self.running -= 1
+        new_tokens = torch.zeros((1, max_new_tokens), dtype=input_ids.dtype)
+        return torch.cat([input_ids, new_tokens], dim=1)
+
+
+class Tokens:
+    pad_token_id = 0
+
+    def __init__(self, input_ids):
+        self.input_ids = input_ids
+
+
+class CharTokenizer:
+    pad_token_id = 0
+
+    def __call__(self, text, return_tensors=None, add_special_tokens=True):
+        return Tokens(torch.tensor([[ord(c) for c in text]]))
+
+    def decode(self, ids, skip_special_tokens=False):
+        return "- JUMP\n" * len(ids)
+
+
+def test_one_generation_at_a_time():
+    model = SlowModel()
+    generator = PrefixCachedGenerator(model, CharTokenizer())
+    with ThreadPoolExecutor(4) as pool:
+        texts = list(
+            pool.map(lambda i: generator.generate([f"state {i}"], 2), range(8))
+        )
+    assert texts == [["- JUMP\n- JUMP\n"]] * 8
+    assert model.most_running == 1
@@ -0,0 +1,89 @@
+import asyncio
+import os
+import sys
+
+import pygame
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends import MockBackend
+from controllers import Controller, ReplayController
+from engine import Match, fighter_pair, llm_fighters
+from inference import InferenceScheduler
+from llm_fighter import VALID_ACTIONS
+from replay import ReplayMatch, ReplayReader, ReplayRecorder
+
+TICKS = 1500
+
+
+async def record(path, make_fighters):
+    recorder = ReplayRecorder(str(path))
+    match = Match(make_fighters, fps=None, observers=[recorder])
+    for _ in range(TICKS):
+        await match.step()
+    match.cancel_requests()
+    recorder.close()
+    return match
+
+
+def replay_fighters(reader):
+    players = reader.header["players"]
+    return fighter_pair(
+        lambda clock: ReplayController(reader.plans[1], players[0]["model"]),
+        lambda clock: ReplayController(reader.plans[2], players[1]["model"]),
+    )
+
+
+@pytest.fixture
+def recording(tmp_path):
+    path = tmp_path / "match.bin"
+    llm = InferenceScheduler(MockBackend(VALID_ACTIONS, seed=0))
+    make_fighters = llm_fighters("mock", "", "mock", "", llm, adaptive_cooldown=False)
+    asyncio.run(record(path, make_fighters))
+    reader = ReplayReader(str(path))
+    yield path, reader
+    reader.close()
+
+
+def test_replayed_plans_record_the_same_match(recording, tmp_path):
+    path, reader = recording
+    assert len(reader) == TICKS
+    assert reader.plans[1] and reader.plans[2]
+    # the plans moved the fighters, so replaying them proves something
+    assert len({reader[i][6] for i in range(len(reader))}) > 1
+    again = tmp_path / "again.bin"
+    asyncio.run(record(again, replay_fighters(reader)))
+    assert again.read_bytes() == path.read_bytes()
+
+
+def test_plan_at(recording):
+    _, reader = recording
+    tick, moves, _ = reader.plans[1][1]
+    assert reader.plan_at(1, tick) == moves
+    assert reader.plan_at(1, tick - 1) == reader.plans[1][0][1]
+    assert reader.plan_at(1, reader.plans[1][0][0] - 1) == []
+
+
+def test_backwards_replay(recording):
+    _, reader = recording
+    sheet = pygame.Surface((2000, 2000))
+    match = ReplayMatch(reader, sheet, sheet, speed=-2)
+    match.seek(reader.first_tick + 10)
+    ticks = []
+    while match.running:
+        match.step()
+        ticks.append(match.clock.tick)
+    assert ticks == list(range(reader.first_tick + 10, reader.first_tick - 1, -2))
+
+
+def test_empty_recording(tmp_path):
+    path = tmp_path / "empty.bin"
+    recorder = ReplayRecorder(str(path))
+    match = Match(
+        fighter_pair(lambda clock: Controller(), lambda clock: Controller()), fps=None
+    )
+    recorder.start(match)
+    recorder.close()
+    with pytest.raises(ValueError, match="has no ticks"):
+        ReplayReader(str(path))
@@ -0,0 +1,85 @@
+import asyncio
+import gzip
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends import MockBackend
+from inference import SAMPLING_TEMPERATURE, InferenceScheduler
+from llm_fighter import VALID_ACTIONS
+from selfplay import MANIFEST, DatasetWriter, DigestSet, digest, generate
+
+
+def write_dataset(directory, matches, temperature=SAMPLING_TEMPERATURE):
+    backend = MockBackend(VALID_ACTIONS, seed=0, temperature=temperature)
+    writer = DatasetWriter(str(directory))
+    asyncio.run(generate(InferenceScheduler(backend), writer, matches, 1, 0, 4))
+    writer.close()
+    return writer
+
+
+def test_matches_add_new_samples(tmp_path):
+    one = write_dataset(tmp_path / "one", 1)
+    many = write_dataset(tmp_path / "many", 4)
+    assert one.samples > 0
+    # every match brings samples the others didn't
+    assert many.samples > 2 * one.samples
+    assert many.empty_matches == []
+
+
+def sample(prompt, completion="- JUMP\n"):
+    return {"prompt": prompt, "completion": completion}
+
+
+def test_digest_set():
+    digests = DigestSet(batch=4)
+    keys = [digest(f"prompt {i}") for i in range(10)]
+    for key in keys:
+        digests.add(key)
+    # two batches were merged into the sorted array
+    assert len(digests.sorted) == 8
+    assert len(digests) == 10
+    assert all(key in digests for key in keys)
+    assert digest("prompt 10") not in digests
+    assert 0 not in digests
+
+
+def test_writer_shards_and_dedups(tmp_path):
+    writer = DatasetWriter(str(tmp_path), shard_size=3)
+    writer.write_match(0, [sample("a"), sample("b"), sample("a")])
+    writer.write_match(1, [sample("a", "- LOW_ATTACK\n"), sample("c")])
+    writer.write_match(2, [sample("c")])
+    writer.close()
+    assert writer.duplicates == 2
+    assert writer.samples == 4
+
+    with open(tmp_path / MANIFEST) as f:
+        manifest = json.load(f)
+    assert manifest["shards"] == [
+        {"name": "shard-00000.jsonl.gz", "samples": 4, "matches": [0, 1]}
+    ]
+    assert manifest["empty_matches"] == [2]
+    with gzip.open(tmp_path / "shard-00000.jsonl.gz", "rt") as f:
+        prompts = [json.loads(line)["prompt"] for line in f]
+    assert prompts == ["a", "b", "a", "c"]
+
+
+def test_writer_resumes(tmp_path):
+    writer = DatasetWriter(str(tmp_path), shard_size=2)
+    writer.write_match(0, [sample("a"), sample("b")])
+    # a match cut off before its shard was finished
+    writer.write_match(1, [sample("c")])
+    writer.file.close()
+
+    resumed = DatasetWriter(str(tmp_path), shard_size=2)
+    assert resumed.done == {0}
+    assert resumed.samples == 2
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+    # samples from finished shards are still known duplicates
+    resumed.write_match(1, [sample("a"), sample("c")])
+    resumed.close()
+    assert resumed.duplicates == 1
+    assert resumed.samples == 3
+    assert [shard["matches"] for shard in resumed.shards] == [[0], [1]]
@@ -0,0 +1,48 @@
+from collections import OrderedDict
+
+MAX_TEXT_SURFACES = 256
+
+
+class TextCache:
+    """
+    LRU cache of rendered text surfaces keyed on (font, text, colour).
+
+    HUD strings such as the timer values and `- MOVE_CLOSER` barely change
+    between frames, so each one is rendered once and reused.
+    """
+
+    def __init__(self, max_size=MAX_TEXT_SURFACES):
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, colour, antialias=True):
+        key = (font, text, tuple(colour), antialias)
+        img = self.surfaces.get(key)
+        if img is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return img
+
+        self.misses += 1
+        img = font.render(text, antialias, colour)
+        self.surfaces[key] = img
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+        return img
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.surfaces),
+            "hit_rate": self.hit_rate(),
+        }
+
+    def clear(self):
+        self.surfaces.clear()
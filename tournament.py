@@ -0,0 +1,289 @@
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+
+from engine import Match, llm_fighters
+from inference import (
+    PRECISIONS,
+    SAMPLING_TEMPERATURE,
+    InferenceScheduler,
+    load_backend,
+)
+
+ROUNDS_PER_MATCH = 3
+# z score for a 95% confidence interval
+Z_95 = 1.96
+
+DEFAULT_CONTESTANTS = [
+    {
+        "name": "bloom-defensive",
+        "model": "bigscience/bloom-560m",
+        "system_prompt": "You are a very defensive player",
+    },
+    {
+        "name": "bloom-aggressive",
+        "model": "bigscience/bloom-560m",
+        "system_prompt": "You are a very aggressive player",
+    },
+]
+
+# settings and models of this worker process
+worker_options = {}
+worker_backends = {}  # model name -> Backend
+
+
+def init_worker(prefix_cache, threads, precision="fp32", temperature=0.0):
+    worker_options["prefix_cache"] = prefix_cache
+    worker_options["threads"] = threads
+    worker_options["precision"] = precision
+    worker_options["temperature"] = temperature
+
+
+def get_backend(model_name):
+    # each worker loads a model once and reuses it for every match it plays
+    if model_name not in worker_backends:
+        worker_backends[model_name] = load_backend(
+            model_name,
+            prefix_cache=worker_options.get("prefix_cache", False),
+            precision=worker_options.get("precision", "fp32"),
+            threads=worker_options.get("threads"),
+            temperature=worker_options.get("temperature", 0.0),
+        )
+    return worker_backends[model_name]
+
+
+def match_seed(seed, i):
+    return random.Random(f"{seed}:{i}").getrandbits(32)
+
+
+async def run_match(contestant_1, contestant_2, rounds):
+    llm_1 = InferenceScheduler(get_backend(contestant_1["model"]))
+    if contestant_2["model"] == contestant_1["model"]:
+        llm_2 = llm_1
+    else:
+        llm_2 = InferenceScheduler(get_backend(contestant_2["model"]))
+
+    # a fixed model cadence keeps the match fair however busy the box is
+    make_fighters = llm_fighters(
+        contestant_1["name"],
+        contestant_1["system_prompt"],
+        contestant_2["name"],
+        contestant_2["system_prompt"],
+        llm_1,
+        adaptive_cooldown=False,
+        llm_2=llm_2,
+    )
+    match = Match(make_fighters, fps=None)
+    await match.run(rounds=rounds)
+    return match.results
+
+
+def play_match(task):
+    """
+    Play one headless match in a worker process and return its round results.
+    The match's seed drives the model's sampling, so it plays the same in
+    whichever worker runs it.
+    """
+    contestant_1, contestant_2, rounds, seed = task
+    from transformers import set_seed
+
+    set_seed(seed)
+    results = asyncio.run(run_match(contestant_1, contestant_2, rounds))
+    return {
+        "player_1": contestant_1["name"],
+        "player_2": contestant_2["name"],
+        "results": results,
+    }
+
+
+def round_robin(contestants, pool, rounds, legs, seed=0):
+    """
+    Every contestant plays every other one `legs` times, switching sides
+    between legs
+    """
+    tasks = []
+    for contestant_1, contestant_2 in itertools.combinations(contestants, 2):
+        for leg in range(legs):
+            sides = (
+                (contestant_2, contestant_1)
+                if leg % 2
+                else (contestant_1, contestant_2)
+            )
+            tasks.append((*sides, rounds, match_seed(seed, len(tasks))))
+    return pool.map(play_match, tasks)
+
+
+def bracket(contestants, pool, rounds, seed=0):
+    """
+    Single elimination in seeding order. A drawn match goes to the higher seed
+    and an odd contestant out gets a bye.
+    """
+    matches = []
+    alive = list(contestants)
+    while len(alive) > 1:
+        pairs = [(alive[i], alive[i + 1]) for i in range(0, len(alive) - 1, 2)]
+        tasks = [
+            (a, b, rounds, match_seed(seed, len(matches) + i))
+            for i, (a, b) in enumerate(pairs)
+        ]
+        outcomes = pool.map(play_match, tasks)
+        matches.extend(outcomes)
+
+        winners = []
+        for (contestant_1, contestant_2), outcome in zip(pairs, outcomes):
+            wins_1 = outcome["results"].count(1)
+            wins_2 = outcome["results"].count(2)
+            winners.append(contestant_2 if wins_2 > wins_1 else contestant_1)
+        if len(alive) % 2:
+            winners.append(alive[-1])
+        alive = winners
+    return matches
+
+
+def wilson_interval(successes, trials, z=Z_95):
+    if trials == 0:
+        return 0.0, 1.0
+    p = successes / trials
+    denominator = 1 + z * z / trials
+    centre = (p + z * z / (2 * trials)) / denominator
+    margin = (
+        z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials))
+    ) / denominator
+    return max(0.0, centre - margin), min(1.0, centre + margin)
+
+
+def standings(contestants, matches):
+    """
+    Return one row per contestant, best win rate first. A tied round counts
+    as half a win, and the interval is a 95% Wilson score interval.
+
+    The interval treats every round as an independent trial, which only
+    holds while the models sample. Decoding greedily (temperature 0) with
+    the fixed model cadence, every round between the same two fighters on
+    the same sides plays out identically, so the interval overstates how
+    sure the standings are.
+    """
+    table = {c["name"]: {"wins": 0, "losses": 0, "ties": 0} for c in contestants}
+    for match in matches:
+        player_1 = table[match["player_1"]]
+        player_2 = table[match["player_2"]]
+        for winner in match["results"]:
+            if winner == 1:
+                player_1["wins"] += 1
+                player_2["losses"] += 1
+            elif winner == 2:
+                player_2["wins"] += 1
+                player_1["losses"] += 1
+            else:
+                player_1["ties"] += 1
+                player_2["ties"] += 1
+
+    rows = []
+    for name, row in table.items():
+        played = row["wins"] + row["losses"] + row["ties"]
+        score = row["wins"] + 0.5 * row["ties"]
+        low, high = wilson_interval(score, played)
+        rows.append(
+            {
+                "name": name,
+                "rounds": played,
+                **row,
+                "win_rate": score / played if played else 0.0,
+                "ci_low": low,
+                "ci_high": high,
+            }
+        )
+    rows.sort(key=lambda row: row["win_rate"], reverse=True)
+    return rows
+
+
+def print_standings(rows):
+    print(f"{'contestant':<30} {'rounds':>6} {'W-L-T':>10} {'win rate':>9}  95% CI")
+    for row in rows:
+        record = f"{row['wins']}-{row['losses']}-{row['ties']}"
+        print(
+            f"{row['name']:<30} {row['rounds']:>6} {record:>10} "
+            f"{row['win_rate']:>9.3f}  [{row['ci_low']:.3f}, {row['ci_high']:.3f}]"
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Model Brawl League tournament")
+    parser.add_argument(
+        "contestants",
+        nargs="?",
+        help="JSON file with a list of {name, model, system_prompt} contestants",
+    )
+    parser.add_argument(
+        "--format", choices=["round-robin", "bracket"], default="round-robin"
+    )
+    parser.add_argument(
+        "--rounds", type=int, default=ROUNDS_PER_MATCH, help="rounds per match"
+    )
+    parser.add_argument(
+        "--legs",
+        type=int,
+        default=2,
+        help="round-robin matches per pairing, alternating sides",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count(), help="worker processes"
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="torch threads per worker (default: cores / workers)",
+    )
+    parser.add_argument("--prefix-cache", action="store_true")
+    parser.add_argument("--precision", choices=PRECISIONS, default="fp32")
+    parser.add_argument(
+        "--seed", type=int, default=0, help="seed of every match's model sampling"
+    )
+    parser.add_argument(
+        "--temperature",
+        type=float,
+        default=SAMPLING_TEMPERATURE,
+        help="model sampling temperature; 0 decodes greedily, which makes "
+        "every round of a pairing the same",
+    )
+    parser.add_argument(
+        "--output", help="write matches and standings to this JSON file"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.contestants:
+        with open(args.contestants) as f:
+            contestants = json.load(f)
+    else:
+        contestants = DEFAULT_CONTESTANTS
+
+    threads = args.threads or max(1, os.cpu_count() // args.workers)
+    with multiprocessing.Pool(
+        args.workers,
+        initializer=init_worker,
+        initargs=(args.prefix_cache, threads, args.precision, args.temperature),
+    ) as pool:
+        if args.format == "bracket":
+            matches = bracket(contestants, pool, args.rounds, args.seed)
+        else:
+            matches = round_robin(contestants, pool, args.rounds, args.legs, args.seed)
+
+    rows = standings(contestants, matches)
+    print_standings(rows)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"matches": matches, "standings": rows}, f, indent=2)
+
+
+# This is the program entry point:
+if __name__ == "__main__":
+    main()